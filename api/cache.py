@@ -0,0 +1,63 @@
+"""In-process TTL cache for the query layer.
+
+The query layer loads each parquet file into memory once at import, so
+query results are fixed for the life of the process; a data refresh only
+shows up after a redeploy. An expired entry is recomputed to the same value,
+so the TTL does not bound staleness — memory is bounded by maxsize (LRU).
+"""
+
+from __future__ import annotations
+
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+
+def ttl_cache(ttl: float = 3600, maxsize: int = 1024):
+    """Memoize a function on its arguments for ``ttl`` seconds, LRU-bounded.
+
+    Cached values are shared between callers, so treat them as read-only.
+    """
+
+    def decorator(func):
+        entries: OrderedDict = OrderedDict()
+        lock = threading.Lock()
+
+        def _live(key):
+            with lock:
+                hit = entries.get(key)
+                if hit is not None and time.monotonic() - hit[0] < ttl:
+                    entries.move_to_end(key)
+                    return hit
+            return None
+
+        def lookup(*args, **kwargs):
+            """The cached value for these arguments, or None on a miss.
+
+            Never calls ``func``, so it is safe to use from the event loop.
+            """
+            hit = _live((args, tuple(sorted(kwargs.items()))))
+            return None if hit is None else hit[1]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            hit = _live(key)
+            if hit is not None:
+                return hit[1]
+
+            now = time.monotonic()
+            value = func(*args, **kwargs)
+            with lock:
+                entries[key] = (now, value)
+                entries.move_to_end(key)
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+            return value
+
+        wrapper.cache_clear = entries.clear
+        wrapper.cache_lookup = lookup
+        return wrapper
+
+    return decorator
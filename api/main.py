@@ -2,10 +2,14 @@
 
 from __future__ import annotations
 
+import anyio
+import orjson
 from fastapi import FastAPI, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 
 from api import queries
+from api.cache import ttl_cache
 from api.models import (
     BudgetVsActual,
     CapitalProject,
@@ -18,6 +22,43 @@ from api.models import (
     SpendingTrend,
 )
 
+
+class ORJSONResponse(Response):
+    """JSON response rendered straight to bytes by orjson (no stdlib json pass)."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+# DuckDB calls block, so endpoints run them on worker threads — no more at
+# once than the engine has threads, so queued requests don't oversubscribe it
+_DB_LIMITER = anyio.CapacityLimiter(queries._THREADS)
+
+
+async def _in_thread(func, *args):
+    return await anyio.to_thread.run_sync(func, *args, limiter=_DB_LIMITER)
+
+
+@ttl_cache()
+def _encoded(query, *args) -> bytes:
+    """``query(*args)`` serialized to JSON, cached so repeat requests skip encoding.
+
+    Calls the undecorated query so a result is cached once, as bytes, rather
+    than also as the Python list in the query layer's own cache.
+    """
+    return orjson.dumps(query.__wrapped__(*args))
+
+
+async def _json(query, *args) -> Response:
+    # A hit is served on the event loop; only misses queue for a DB thread
+    body = _encoded.cache_lookup(query, *args)
+    if body is None:
+        body = await _in_thread(_encoded, query, *args)
+    return Response(body, media_type="application/json")
+
+
 app = FastAPI(
     title="San Diego City Budget API",
     description=(
@@ -26,12 +67,13 @@ app = FastAPI(
         "Data covers FY2011-FY2026 for budgets and FY2011-FY2023 for actuals."
     ),
     version="0.1.0",
+    default_response_class=ORJSONResponse,
 )
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
 
 @app.get("/health")
-def health():
+async def health():
     """Debug endpoint — shows data path and file availability."""
     from pathlib import Path
     agg = Path(queries._AGG)
@@ -40,7 +82,7 @@ def health():
 
 
 @app.get("/")
-def root():
+async def root():
     return {
         "message": "San Diego City Budget API",
         "docs": "/docs",
@@ -53,13 +95,13 @@ def root():
 
 
 @app.get("/filters", response_model=FilterOptions)
-def filters():
+async def filters():
     """Available fiscal years, budget cycles, fund types, and department groups."""
-    return queries.get_filter_options()
+    return await _in_thread(queries.get_filter_options)
 
 
 @app.get("/overview", response_model=OverviewResponse)
-def overview(
+async def overview(
     fy_min: int = Query(2024, description="Start fiscal year"),
     fy_max: int = Query(2026, description="End fiscal year"),
     cycle: str | None = Query(None, description="Budget cycle (adopted, proposed)"),
@@ -67,76 +109,76 @@ def overview(
     dept_group: str | None = Query(None, description="Filter by department group"),
 ):
     """Total expense, total revenue, and general fund percentage."""
-    return queries.get_overview(fy_min, fy_max, cycle, fund_type, dept_group)
+    return await _in_thread(queries.get_overview, fy_min, fy_max, cycle, fund_type, dept_group)
 
 
-@app.get("/departments", response_model=list[DepartmentSpending])
-def departments(
+@app.get("/departments", responses={200: {"model": list[DepartmentSpending]}})
+async def departments(
     fy_min: int = Query(2024, description="Start fiscal year"),
     fy_max: int = Query(2026, description="End fiscal year"),
     cycle: str | None = Query(None, description="Budget cycle"),
     dept_group: str | None = Query(None, description="Filter by department group"),
     limit: int = Query(10, ge=1, le=100, description="Max departments to return"),
-):
+) -> Response:
     """Top departments by expense spending."""
-    return queries.get_department_spending(fy_min, fy_max, cycle, dept_group, limit)
+    return await _json(queries.get_department_spending, fy_min, fy_max, cycle, dept_group, limit)
 
 
-@app.get("/funds", response_model=list[FundAllocation])
-def funds(
+@app.get("/funds", responses={200: {"model": list[FundAllocation]}})
+async def funds(
     fy_min: int = Query(2024, description="Start fiscal year"),
     fy_max: int = Query(2026, description="End fiscal year"),
     cycle: str | None = Query(None, description="Budget cycle"),
-):
+) -> Response:
     """Spending breakdown by fund type."""
-    return queries.get_fund_allocation(fy_min, fy_max, cycle)
+    return await _json(queries.get_fund_allocation, fy_min, fy_max, cycle)
 
 
-@app.get("/revenue", response_model=list[RevenueSource])
-def revenue(
+@app.get("/revenue", responses={200: {"model": list[RevenueSource]}})
+async def revenue(
     fy_min: int = Query(2024, description="Start fiscal year"),
     fy_max: int = Query(2026, description="End fiscal year"),
     cycle: str | None = Query(None, description="Budget cycle"),
-):
+) -> Response:
     """Revenue breakdown by source type."""
-    return queries.get_revenue_sources(fy_min, fy_max, cycle)
+    return await _json(queries.get_revenue_sources, fy_min, fy_max, cycle)
 
 
 @app.get("/budget-vs-actuals", response_model=list[BudgetVsActual])
-def budget_vs_actuals(
+async def budget_vs_actuals(
     fy_min: int = Query(2020, description="Start fiscal year"),
     fy_max: int = Query(2023, description="End fiscal year (actuals available through FY2023)"),
     limit: int = Query(15, ge=1, le=100, description="Max departments to return"),
 ):
     """Budget vs actual spending by department. Actuals available through FY2023."""
-    return queries.get_budget_vs_actuals(fy_min, fy_max, limit)
+    return await _in_thread(queries.get_budget_vs_actuals, fy_min, fy_max, limit)
 
 
 @app.get("/departments/{dept_name}", response_model=list[DepartmentDetail])
-def department_detail(
+async def department_detail(
     dept_name: str,
     fy_min: int = Query(2024, description="Start fiscal year"),
     fy_max: int = Query(2026, description="End fiscal year"),
 ):
     """Division and account breakdown for a specific department."""
-    return queries.get_department_detail(dept_name, fy_min, fy_max)
+    return await _in_thread(queries.get_department_detail, dept_name, fy_min, fy_max)
 
 
-@app.get("/trends", response_model=list[SpendingTrend])
-def trends(
+@app.get("/trends", responses={200: {"model": list[SpendingTrend]}})
+async def trends(
     fy_min: int = Query(2015, description="Start fiscal year"),
     fy_max: int = Query(2026, description="End fiscal year"),
-):
+) -> Response:
     """Year-over-year spending trends by department group (adopted budgets)."""
-    return queries.get_spending_trends(fy_min, fy_max)
+    return await _json(queries.get_spending_trends, fy_min, fy_max)
 
 
-@app.get("/capital-projects", response_model=list[CapitalProject])
-def capital_projects(
+@app.get("/capital-projects", responses={200: {"model": list[CapitalProject]}})
+async def capital_projects(
     fy_min: int = Query(2024, description="Start fiscal year"),
     fy_max: int = Query(2026, description="End fiscal year"),
     dept: str | None = Query(None, description="Filter by department (e.g. Fire-Rescue)"),
     limit: int = Query(20, ge=1, le=200, description="Max projects to return"),
-):
+) -> Response:
     """Capital improvement projects, optionally filtered by department."""
-    return queries.get_capital_projects(fy_min, fy_max, dept, limit)
+    return await _json(queries.get_capital_projects, fy_min, fy_max, dept, limit)
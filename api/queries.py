@@ -1,8 +1,11 @@
 """Shared query layer — all SQL lives here.
 
 Both the FastAPI endpoints and MCP tools call these functions.
-Each function creates a fresh DuckDB connection, queries parquet files,
-and returns list[dict] (or dict for single-row responses).
+All queries share one in-memory DuckDB connection (each call gets its own
+cursor, so concurrent requests are safe). Each aggregated parquet file is
+loaded once at import into a native DuckDB table, so requests never decode
+parquet. Functions return list[dict] (or dict for single-row responses). Results are
+memoized per argument tuple for an hour; treat them as read-only.
 """
 
 from __future__ import annotations
@@ -11,93 +14,137 @@ from pathlib import Path
 
 import duckdb
 
+from api.cache import ttl_cache
+
 # Resolve parquet directory relative to repo root
 _ROOT = Path(__file__).resolve().parent.parent
 _AGG = str(_ROOT / "data" / "aggregated")
 
+# Columns each table keeps — only what the queries below read, so loading
+# never decodes a column chunk the API doesn't use
+_TABLES: dict[str, tuple[str, ...]] = {
+    "dept_budget_trends": (
+        "fiscal_year", "budget_cycle", "source", "revenue_or_expense",
+        "dept_group", "dept_name", "amount",
+    ),
+    "fund_allocation": (
+        "fiscal_year", "budget_cycle", "source", "revenue_or_expense", "fund_type", "amount",
+    ),
+    "revenue_breakdown": ("fiscal_year", "budget_cycle", "source", "account_type", "amount"),
+    "budget_vs_actuals": (
+        "fiscal_year", "account_type", "dept_name", "budget_amount", "actual_amount",
+    ),
+    "dept_detail": (
+        "fiscal_year", "source", "revenue_or_expense", "dept_name",
+        "dept_division", "account_class", "amount",
+    ),
+    "cip_by_dept": ("fiscal_year", "source", "asset_owning_dept", "project_name", "amount"),
+}
+
+# One connection for the process — cursors share its catalog and caches.
+# Settings are explicit rather than DuckDB's host-derived defaults, which
+# can overshoot a small container: the tables total a few MB and each fits
+# in one row group, so more threads can't split a scan, and the memory cap
+# leaves headroom for the web worker on a 512MB instance.
+_THREADS = 2
+_CON = duckdb.connect(":memory:", config={"threads": _THREADS, "memory_limit": "256MB"})
+for _name, _cols in _TABLES.items():
+    # Skip missing files so /health can still report what's there
+    if Path(_AGG, f"{_name}.parquet").exists():
+        _CON.execute(
+            f"CREATE TABLE {_name} AS SELECT {', '.join(_cols)} "
+            f"FROM read_parquet('{_AGG}/{_name}.parquet')"
+        )
+
+
+def _where(*columns: str, extra: list[str] | tuple[str, ...] = ()) -> str:
+    """Build a fixed-shape WHERE clause: a fiscal-year range, an optional
+    equality filter on each of ``columns``, then the ``extra`` predicates.
+
+    Optional filters are NULL-tolerant (``? IS NULL OR col = ?``), so the
+    SQL text depends only on the columns, never on which filters a caller
+    set — each query below is a constant built once at import. Bind with
+    :func:`_params`, passing values in the same column order.
+    """
+    clauses = ["fiscal_year >= ?", "fiscal_year <= ?"]
+    clauses += [f"(? IS NULL OR {col} = ?)" for col in columns]
+    clauses += extra
+    return "WHERE " + " AND ".join(clauses)
 
-def _q(where: str, condition: str) -> str:
-    """Append a condition to a WHERE clause safely."""
-    if not where:
-        return f"WHERE {condition}"
-    return f"{where} AND {condition}"
 
+def _params(fy_min: int, fy_max: int, *values: str | None) -> list:
+    """Bind values for a :func:`_where` clause (each optional one twice)."""
+    params: list = [int(fy_min), int(fy_max)]
+    for value in values:
+        params += [value or None] * 2
+    return params
 
-def _where(
-    fy_min: int | None,
-    fy_max: int | None,
-    cycle: str | None = None,
-    fund_type: str | None = None,
-    dept_group: str | None = None,
-    *,
-    has_fund_type: bool = True,
-    has_dept_group: bool = True,
-    has_cycle: bool = True,
-) -> str:
-    """Build a WHERE clause from optional filter params.
-
-    Respects which columns each parquet actually has.
-    """
-    clauses: list[str] = []
-    if fy_min is not None:
-        clauses.append(f"fiscal_year >= {int(fy_min)}")
-    if fy_max is not None:
-        clauses.append(f"fiscal_year <= {int(fy_max)}")
-    if cycle and has_cycle:
-        clauses.append(f"budget_cycle = '{cycle.replace(chr(39), chr(39)*2)}'")
-    if fund_type and has_fund_type:
-        clauses.append(f"fund_type = '{fund_type.replace(chr(39), chr(39)*2)}'")
-    if dept_group and has_dept_group:
-        clauses.append(f"dept_group = '{dept_group.replace(chr(39), chr(39)*2)}'")
-    return ("WHERE " + " AND ".join(clauses)) if clauses else ""
-
-
-def _run(sql: str) -> list[dict]:
-    """Execute SQL and return list of row dicts."""
-    con = duckdb.connect()
-    df = con.execute(sql).fetchdf()
-    con.close()
-    return df.to_dict(orient="records")
+
+def _run(sql: str, params: list | None = None) -> list[dict]:
+    """Execute SQL with bound params and return list of row dicts."""
+    with _CON.cursor() as cur:
+        table = cur.execute(sql, params or []).fetch_arrow_table()
+    return table.to_pylist()
 
 
 # ── 1. Filter options ──
 
 
+@ttl_cache()
 def get_filter_options() -> dict:
-    """Return available fiscal years, budget cycles, fund types, and dept groups."""
-    con = duckdb.connect()
-    years = sorted(
-        con.execute(
-            f"SELECT DISTINCT fiscal_year FROM '{_AGG}/dept_budget_trends.parquet' "
-            "WHERE fiscal_year IS NOT NULL ORDER BY fiscal_year"
-        ).fetchdf()["fiscal_year"].tolist()
-    )
-    cycles = sorted(
-        con.execute(
-            f"SELECT DISTINCT budget_cycle FROM '{_AGG}/dept_budget_trends.parquet' "
-            "WHERE budget_cycle IS NOT NULL ORDER BY budget_cycle"
-        ).fetchdf()["budget_cycle"].tolist()
-    )
-    fund_types = con.execute(
-        f"SELECT DISTINCT fund_type FROM '{_AGG}/fund_allocation.parquet' "
-        "WHERE fund_type IS NOT NULL ORDER BY fund_type"
-    ).fetchdf()["fund_type"].tolist()
-    dept_groups = con.execute(
-        f"SELECT DISTINCT dept_group FROM '{_AGG}/dept_budget_trends.parquet' "
-        "WHERE dept_group IS NOT NULL ORDER BY dept_group"
-    ).fetchdf()["dept_group"].tolist()
-    con.close()
+    """Return available fiscal years, budget cycles, fund types, and dept groups.
+
+    One statement: a single pass over dept_budget_trends collects three
+    sorted distinct lists, and a scalar subquery covers fund_allocation.
+    """
+    with _CON.cursor() as cur:
+        years, cycles, dept_groups, fund_types = cur.execute(
+            "SELECT "
+            "  list(DISTINCT fiscal_year ORDER BY fiscal_year) "
+            "    FILTER (WHERE fiscal_year IS NOT NULL), "
+            "  list(DISTINCT budget_cycle ORDER BY budget_cycle) "
+            "    FILTER (WHERE budget_cycle IS NOT NULL), "
+            "  list(DISTINCT dept_group ORDER BY dept_group) "
+            "    FILTER (WHERE dept_group IS NOT NULL), "
+            "  (SELECT list(DISTINCT fund_type ORDER BY fund_type) "
+            "     FILTER (WHERE fund_type IS NOT NULL) FROM fund_allocation) "
+            "FROM dept_budget_trends"
+        ).fetchone()
     return {
-        "fiscal_years": [int(y) for y in years],
-        "budget_cycles": cycles,
-        "fund_types": fund_types,
-        "dept_groups": dept_groups,
+        "fiscal_years": [int(y) for y in years or []],
+        "budget_cycles": cycles or [],
+        "fund_types": fund_types or [],
+        "dept_groups": dept_groups or [],
     }
 
 
 # ── 2. Overview ──
 
 
+# Expense total — dept_budget_trends (has dept_group, NO fund_type)
+_OVERVIEW_EXPENSE_SQL = (
+    "SELECT COALESCE(SUM(amount), 0) AS total FROM dept_budget_trends "
+    + _where(
+        "budget_cycle", "dept_group",
+        extra=["source = 'budget'", "revenue_or_expense = 'Expense'"],
+    )
+)
+# Revenue total — revenue_breakdown (NO dept_group, NO fund_type)
+_OVERVIEW_REVENUE_SQL = (
+    "SELECT COALESCE(SUM(amount), 0) AS total FROM revenue_breakdown "
+    + _where("budget_cycle", extra=["source = 'budget'"])
+)
+# General fund — fund_allocation (has fund_type, NO dept_group)
+_OVERVIEW_GF_SQL = (
+    "SELECT COALESCE(SUM(amount), 0) AS total FROM fund_allocation "
+    + _where(
+        "budget_cycle",
+        extra=["fund_type = 'General Fund'", "source = 'budget'", "revenue_or_expense = 'Expense'"],
+    )
+)
+
+
+@ttl_cache()
 def get_overview(
     fy_min: int = 2024,
     fy_max: int = 2026,
@@ -106,30 +153,15 @@ def get_overview(
     dept_group: str | None = None,
 ) -> dict:
     """Total expense, total revenue, and general fund percentage."""
-    con = duckdb.connect()
-
-    # Expense total — dept_budget_trends (has dept_group, NO fund_type)
-    w_exp = _where(fy_min, fy_max, cycle, dept_group=dept_group, has_fund_type=False)
-    w_exp = _q(w_exp, "source = 'budget' AND revenue_or_expense = 'Expense'")
-    total_expense = con.execute(
-        f"SELECT COALESCE(SUM(amount), 0) AS total FROM '{_AGG}/dept_budget_trends.parquet' {w_exp}"
-    ).fetchone()[0]
-
-    # Revenue total — revenue_breakdown (NO dept_group, NO fund_type)
-    w_rev = _where(fy_min, fy_max, cycle, has_fund_type=False, has_dept_group=False)
-    w_rev = _q(w_rev, "source = 'budget'")
-    total_revenue = con.execute(
-        f"SELECT COALESCE(SUM(amount), 0) AS total FROM '{_AGG}/revenue_breakdown.parquet' {w_rev}"
-    ).fetchone()[0]
-
-    # General fund — fund_allocation (has fund_type, NO dept_group)
-    w_gf = _where(fy_min, fy_max, cycle, fund_type="General Fund", has_dept_group=False)
-    w_gf = _q(w_gf, "source = 'budget' AND revenue_or_expense = 'Expense'")
-    total_gf = con.execute(
-        f"SELECT COALESCE(SUM(amount), 0) AS total FROM '{_AGG}/fund_allocation.parquet' {w_gf}"
-    ).fetchone()[0]
-
-    con.close()
+    with _CON.cursor() as cur:
+        total_expense = cur.execute(
+            _OVERVIEW_EXPENSE_SQL, _params(fy_min, fy_max, cycle, dept_group)
+        ).fetchone()[0]
+        total_revenue = cur.execute(
+            _OVERVIEW_REVENUE_SQL, _params(fy_min, fy_max, cycle)
+        ).fetchone()[0]
+        total_gf = cur.execute(_OVERVIEW_GF_SQL, _params(fy_min, fy_max, cycle)).fetchone()[0]
+
     gf_pct = (total_gf / total_expense * 100) if total_expense else 0
     return {
         "total_expense": float(total_expense),
@@ -141,6 +173,17 @@ def get_overview(
 # ── 3. Department spending ──
 
 
+_DEPT_SPENDING_SQL = (
+    "SELECT dept_name, SUM(amount) AS amount FROM dept_budget_trends "
+    + _where(
+        "budget_cycle", "dept_group",
+        extra=["source = 'budget'", "revenue_or_expense = 'Expense'"],
+    )
+    + " GROUP BY dept_name ORDER BY amount DESC LIMIT ?"
+)
+
+
+@ttl_cache()
 def get_department_spending(
     fy_min: int = 2024,
     fy_max: int = 2026,
@@ -149,54 +192,66 @@ def get_department_spending(
     limit: int = 10,
 ) -> list[dict]:
     """Top N departments by expense amount."""
-    w = _where(fy_min, fy_max, cycle, dept_group=dept_group, has_fund_type=False)
-    w = _q(w, "source = 'budget' AND revenue_or_expense = 'Expense'")
-    return _run(
-        f"SELECT dept_name, SUM(amount) AS amount "
-        f"FROM '{_AGG}/dept_budget_trends.parquet' {w} "
-        f"GROUP BY dept_name ORDER BY amount DESC LIMIT {int(limit)}"
-    )
+    return _run(_DEPT_SPENDING_SQL, [*_params(fy_min, fy_max, cycle, dept_group), int(limit)])
 
 
 # ── 4. Fund allocation ──
 
 
+_FUND_ALLOCATION_SQL = (
+    "SELECT fund_type, SUM(amount) AS amount FROM fund_allocation "
+    + _where("budget_cycle", extra=["source = 'budget'", "revenue_or_expense = 'Expense'"])
+    + " GROUP BY fund_type ORDER BY amount DESC"
+)
+
+
+@ttl_cache()
 def get_fund_allocation(
     fy_min: int = 2024,
     fy_max: int = 2026,
     cycle: str | None = None,
 ) -> list[dict]:
     """Spending by fund type."""
-    w = _where(fy_min, fy_max, cycle, has_dept_group=False)
-    w = _q(w, "source = 'budget' AND revenue_or_expense = 'Expense'")
-    return _run(
-        f"SELECT fund_type, SUM(amount) AS amount "
-        f"FROM '{_AGG}/fund_allocation.parquet' {w} "
-        f"GROUP BY fund_type ORDER BY amount DESC"
-    )
+    return _run(_FUND_ALLOCATION_SQL, _params(fy_min, fy_max, cycle))
 
 
 # ── 5. Revenue sources ──
 
 
+_REVENUE_SOURCES_SQL = (
+    "SELECT account_type, SUM(amount) AS amount FROM revenue_breakdown "
+    + _where("budget_cycle", extra=["source = 'budget'"])
+    + " GROUP BY account_type ORDER BY amount DESC"
+)
+
+
+@ttl_cache()
 def get_revenue_sources(
     fy_min: int = 2024,
     fy_max: int = 2026,
     cycle: str | None = None,
 ) -> list[dict]:
     """Revenue by account type."""
-    w = _where(fy_min, fy_max, cycle, has_fund_type=False, has_dept_group=False)
-    w = _q(w, "source = 'budget'")
-    return _run(
-        f"SELECT account_type, SUM(amount) AS amount "
-        f"FROM '{_AGG}/revenue_breakdown.parquet' {w} "
-        f"GROUP BY account_type ORDER BY amount DESC"
-    )
+    return _run(_REVENUE_SOURCES_SQL, _params(fy_min, fy_max, cycle))
 
 
 # ── 6. Budget vs actuals ──
 
 
+# budget_vs_actuals: has dept_group, NO fund_type, NO budget_cycle
+_BUDGET_VS_ACTUALS_SQL = (
+    "SELECT dept_name, "
+    "  SUM(budget_amount) AS budget_amount, "
+    "  SUM(actual_amount) AS actual_amount, "
+    "  SUM(actual_amount) - SUM(budget_amount) AS variance "
+    "FROM budget_vs_actuals "
+    + _where(extra=["account_type IN ('Personnel', 'Non-Personnel')"])
+    + " GROUP BY dept_name HAVING SUM(budget_amount) != 0"
+    " ORDER BY SUM(budget_amount) DESC LIMIT ?"
+)
+
+
+@ttl_cache()
 def get_budget_vs_actuals(
     fy_min: int = 2020,
     fy_max: int = 2023,
@@ -206,62 +261,66 @@ def get_budget_vs_actuals(
 
     Actuals are only available through FY2023 (city data lag).
     """
-    # budget_vs_actuals: has dept_group, NO fund_type, NO budget_cycle
-    w = _where(fy_min, fy_max, has_fund_type=False, has_cycle=False)
-    w = _q(w, "account_type IN ('Personnel', 'Non-Personnel')")
-    return _run(
-        f"SELECT dept_name, "
-        f"  SUM(budget_amount) AS budget_amount, "
-        f"  SUM(actual_amount) AS actual_amount, "
-        f"  SUM(actual_amount) - SUM(budget_amount) AS variance "
-        f"FROM '{_AGG}/budget_vs_actuals.parquet' {w} "
-        f"GROUP BY dept_name HAVING SUM(budget_amount) != 0 "
-        f"ORDER BY SUM(budget_amount) DESC LIMIT {int(limit)}"
-    )
+    return _run(_BUDGET_VS_ACTUALS_SQL, [*_params(fy_min, fy_max), int(limit)])
 
 
 # ── 7. Department detail ──
 
 
+_DEPARTMENT_DETAIL_SQL = (
+    "SELECT dept_division AS division, account_class, "
+    "  COALESCE(SUM(amount) FILTER (WHERE source = 'budget'), 0) AS budget, "
+    "  COALESCE(SUM(amount) FILTER (WHERE source = 'actual'), 0) AS actual "
+    "FROM dept_detail "
+    + _where(extra=["revenue_or_expense = 'Expense'", "dept_name = ?"])
+    + " GROUP BY dept_division, account_class ORDER BY budget DESC"
+)
+
+
+@ttl_cache()
 def get_department_detail(
     dept_name: str,
     fy_min: int = 2024,
     fy_max: int = 2026,
 ) -> list[dict]:
     """Division/account breakdown for one department."""
-    w = _where(fy_min, fy_max, has_fund_type=False)
-    w = _q(w, "revenue_or_expense = 'Expense'")
-    safe_name = dept_name.replace("'", "''")
-    w = _q(w, f"dept_name = '{safe_name}'")
-    return _run(
-        f"SELECT dept_division AS division, account_class, "
-        f"  SUM(CASE WHEN source = 'budget' THEN amount ELSE 0 END) AS budget, "
-        f"  SUM(CASE WHEN source = 'actual' THEN amount ELSE 0 END) AS actual "
-        f"FROM '{_AGG}/dept_detail.parquet' {w} "
-        f"GROUP BY dept_division, account_class ORDER BY budget DESC"
-    )
+    return _run(_DEPARTMENT_DETAIL_SQL, [*_params(fy_min, fy_max), dept_name])
 
 
 # ── 8. Spending trends ──
 
 
+_SPENDING_TRENDS_SQL = (
+    "SELECT fiscal_year, dept_group, SUM(amount) AS amount FROM dept_budget_trends "
+    + _where(extra=[
+        "budget_cycle = 'adopted'", "source = 'budget'",
+        "revenue_or_expense = 'Expense'", "dept_group IS NOT NULL",
+    ])
+    + " GROUP BY fiscal_year, dept_group ORDER BY fiscal_year, amount DESC"
+)
+
+
+@ttl_cache()
 def get_spending_trends(
     fy_min: int = 2015,
     fy_max: int = 2026,
 ) -> list[dict]:
     """Year-over-year spending by department group (adopted budgets only)."""
-    w = _where(fy_min, fy_max, cycle="adopted", has_fund_type=False)
-    w = _q(w, "source = 'budget' AND revenue_or_expense = 'Expense' AND dept_group IS NOT NULL")
-    return _run(
-        f"SELECT fiscal_year, dept_group, SUM(amount) AS amount "
-        f"FROM '{_AGG}/dept_budget_trends.parquet' {w} "
-        f"GROUP BY fiscal_year, dept_group ORDER BY fiscal_year, amount DESC"
-    )
+    return _run(_SPENDING_TRENDS_SQL, _params(fy_min, fy_max))
 
 
 # ── 9. Capital projects ──
 
 
+# cip_by_dept: NO dept_group, NO fund_type, NO budget_cycle
+_CAPITAL_PROJECTS_SQL = (
+    "SELECT asset_owning_dept, project_name, SUM(amount) AS amount FROM cip_by_dept "
+    + _where("asset_owning_dept", extra=["source = 'budget'"])
+    + " GROUP BY asset_owning_dept, project_name ORDER BY amount DESC LIMIT ?"
+)
+
+
+@ttl_cache()
 def get_capital_projects(
     fy_min: int = 2024,
     fy_max: int = 2026,
@@ -269,15 +328,4 @@ def get_capital_projects(
     limit: int = 20,
 ) -> list[dict]:
     """CIP projects, optionally filtered by department."""
-    # cip_by_dept: NO dept_group, NO fund_type, NO budget_cycle
-    w = _where(fy_min, fy_max, has_fund_type=False, has_dept_group=False, has_cycle=False)
-    w = _q(w, "source = 'budget'")
-    if dept:
-        safe_dept = dept.replace("'", "''")
-        w = _q(w, f"asset_owning_dept = '{safe_dept}'")
-    return _run(
-        f"SELECT asset_owning_dept, project_name, SUM(amount) AS amount "
-        f"FROM '{_AGG}/cip_by_dept.parquet' {w} "
-        f"GROUP BY asset_owning_dept, project_name "
-        f"ORDER BY amount DESC LIMIT {int(limit)}"
-    )
+    return _run(_CAPITAL_PROJECTS_SQL, [*_params(fy_min, fy_max, dept), int(limit)])
@@ -2,18 +2,27 @@
 
 from __future__ import annotations
 
+import json
+import os
 from pathlib import Path
 
 import duckdb
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
+import pyarrow as pa
 import streamlit as st
 
 # ── Parquet paths (relative to repo root, where Streamlit Cloud runs) ──
-_AGG = "data/aggregated"
+# Set BUDGET_AGG_URL to read the aggregates from object storage instead
+# (e.g. https://<bucket>/aggregated); DuckDB fetches each file over httpfs
+# once, when the connection loads it.
+_AGG = os.environ.get("BUDGET_AGG_URL", "data/aggregated").rstrip("/")
+_REMOTE = _AGG.startswith(("http://", "https://", "s3://"))
 
 # Resolve paths for local dev (running from project root or dashboard/)
 _root = Path(__file__).resolve().parent.parent
-if (_root / _AGG).exists():
+if not _REMOTE and (_root / _AGG).exists():
     _AGG = str(_root / _AGG)
 
 st.set_page_config(
@@ -25,11 +34,171 @@ st.set_page_config(
 # Light blue — default chart color across all visualizations
 CHART_COLOR = "#83c9ff"
 
+# Sankey node palettes — revenue greens, fund blues, dept warm tones
+_REV_PALETTE: tuple[str, ...] = (
+    "#2ecc71", "#27ae60", "#1abc9c", "#16a085", "#3498db",
+    "#2980b9", "#0097a7", "#00897b", "#43a047", "#66bb6a",
+    "#4db6ac", "#26a69a", "#81c784",
+)
+_FUND_PALETTE: tuple[str, ...] = (
+    "#5c6bc0", "#42a5f5", "#7e57c2", "#5e35b1",
+    "#3949ab", "#1e88e5", "#039be5",
+)
+_DEPT_PALETTE: tuple[str, ...] = (
+    "#ef5350", "#ec407a", "#ab47bc", "#ff7043",
+    "#ffa726", "#ffca28", "#d4e157", "#66bb6a",
+    "#26c6da", "#78909c", "#8d6e63", "#f06292",
+    "#ba68c8", "#ff8a65", "#ffb74d", "#fff176",
+    "#aed581", "#4db6ac", "#4dd0e1", "#90a4ae",
+    "#a1887f", "#e57373", "#f48fb1", "#ce93d8",
+    "#ffab91", "#ffe082", "#c5e1a5", "#80cbc4",
+    "#80deea", "#b0bec5", "#bcaaa4", "#ef9a9a",
+    "#f8bbd0", "#d1c4e9", "#ffccbc", "#fff9c4",
+    "#dcedc8", "#b2dfdb", "#b2ebf2", "#cfd8dc",
+    "#d7ccc8", "#e0e0e0", "#f5f5f5", "#ffcdd2",
+    "#e1bee7", "#c5cae9", "#bbdefb", "#b3e5fc",
+    "#b2ebf2", "#b2dfdb", "#c8e6c9", "#f0f4c3",
+    "#fff9c4", "#ffecb3", "#ffe0b2", "#ffccbc",
+)
+
+
+def _to_rgba(hex_color: str, alpha: float = 0.35) -> str:
+    """Semi-transparent rgba() form of a #rrggbb color, for Sankey links."""
+    r, g, b = int(hex_color[1:3], 16), int(hex_color[3:5], 16), int(hex_color[5:7], 16)
+    return f"rgba({r},{g},{b},{alpha})"
+
+
+_REV_PALETTE_RGBA = tuple(_to_rgba(c) for c in _REV_PALETTE)
+_FUND_PALETTE_RGBA = tuple(_to_rgba(c) for c in _FUND_PALETTE)
+_DEPT_PALETTE_RGBA = tuple(_to_rgba(c) for c in _DEPT_PALETTE)
+
+
+# Most nodes one Sankey column shows before the rest fold into "Other"
+_SANKEY_MAX_NODES = 50
+
+
+def _cycle(palette: tuple[str, ...], n: int) -> list[str]:
+    """First n colors of a palette, wrapping around."""
+    return [palette[i % len(palette)] for i in range(n)]
+
+
+# Money Flow glossary — static text, kept out of the section body
+_REV_GLOSSARY_MD = """**Revenue Sources** (left)
+
+Where the money comes from:
+- **Charges for Current Services** — fees for city services: water/sewer bills, permits, recreation fees, parking
+- **Property Tax Revenue** — taxes on real estate (the city's single largest General Fund source)
+- **Other Revenue** — miscellaneous: asset sales, reimbursements, prior-year adjustments
+- **Sales Taxes** — the city's local share of California state sales tax (Bradley-Burns 1%)
+- **Transfers In** — money moved between city funds (e.g. General Fund transferring to a capital project fund)
+- **Other Local Taxes** — franchise fees paid by SDG&E, cable companies, property transfer tax
+- **Transient Occupancy Taxes** — 10.5% tax on hotel and short-term rental stays
+- **Licenses and Permits** — building permits, business licenses, encroachment permits
+- **Revenue from Use of Money & Property** — rents, concessions, interest income (e.g. Mission Bay leases)
+- **Fines, Forfeitures & Penalties** — parking citations, code enforcement fines, court penalties
+- **Revenue from Other Agencies** — state/county shared revenue, motor vehicle license fees
+- **Revenue from Federal Agencies** — federal grants and reimbursements
+- **Special Assessments** — charges on specific properties for local improvements (lighting, landscaping)
+"""
+
+_FUND_GLOSSARY_MD = """**Fund Types** (middle)
+
+How money is organized:
+- **Enterprise Funds** — self-supporting services funded by user fees, not taxes. Includes water, sewer, airports, golf courses, refuse, and Development Services. The largest fund type by far.
+- **General Fund** — the city's main discretionary account funded by taxes. Pays for police, fire, parks, libraries, and most city services residents interact with.
+- **Special Revenue Funds** — legally earmarked for specific purposes. Includes gas tax (roads), Maintenance Assessment Districts (neighborhood upkeep), parking meter revenue, and transient occupancy tax.
+- **Internal Service Funds** — departments that provide shared services and bill other departments. Includes Fleet Operations, IT, energy conservation, and central stores.
+- **Capital Project Funds** — funding for long-term infrastructure: buildings, roads, water/sewer pipes, parks. Often funded by bonds or developer impact fees.
+- **Debt Service and Tax Funds** — payments on bonds and short-term borrowing (Tax and Revenue Anticipation Notes).
+"""
+
+_DEPT_GLOSSARY_MD = """**Department Groups** (right)
+
+Who spends the money:
+- **Public Utilities** — water and sewer systems, the city's largest operation (~$1.2B, almost entirely enterprise funds from ratepayer bills)
+- **Police** — law enforcement, the largest General Fund department (~$680M)
+- **Fire-Rescue** — fire suppression, EMS/ambulance, lifeguards, community risk reduction (~$480M)
+- **Parks & Recreation** — 400+ parks, rec centers, Balboa Park, Mission Bay Park, open space
+- **Citywide Program Expenditures** — citywide costs not tied to one department: pension obligations, retiree health care, citywide contracts
+- **Environmental Services** — waste collection, recycling, landfills, environmental compliance
+- **Transportation** — street maintenance, traffic signals, streetlights, transit coordination
+- **General Services** — facilities maintenance, security, fleet operations, building management
+- **Engineering & Capital Projects** — design and construction of city infrastructure
+- **Special Promotional Programs** — tourism marketing, convention center promotion (funded by hotel tax)
+- **Citywide Other/Special Funds** — debt service, insurance reserves, special fund expenditures
+- **Development Services** — building permits, plan review, code enforcement (enterprise fund)
+- **Dept. of Information Technology** — citywide IT infrastructure, systems, cybersecurity
+- **City Attorney** — legal counsel, litigation, prosecution
+- **Library** — 36 branch libraries and the Central Library
+- **Stormwater** — storm drain maintenance, water quality, flood control
+- **Homelessness Strategies & Solutions** — shelters, outreach, housing programs
+- **Real Estate & Airport Management** — city-owned properties, airport operations
+- **Redevelopment Agency / Housing Successor** — wind-down of dissolved redevelopment agency, affordable housing obligations
+- **City Treasurer** — investment management, debt administration
+- **Other departments** — City Council, Planning, Purchasing & Contracting, Economic Development, Sustainability & Mobility, Risk Management, Human Resources, City Clerk, and more
+"""
+
+
+# Aggregated parquet files, each loaded into a table of the same name
+_TABLES = (
+    "budget_vs_actuals",
+    "cip_by_dept",
+    "council_offices",
+    "dept_budget_trends",
+    "dept_detail",
+    "fund_allocation",
+    "general_fund_summary",
+    "revenue_breakdown",
+    "sankey_expense",
+    "sankey_revenue",
+)
+
+
+@st.cache_resource
+def _get_con() -> duckdb.DuckDBPyConnection:
+    """One in-memory DuckDB connection shared across reruns and sessions,
+    with each aggregated parquet file loaded into a table."""
+    con = duckdb.connect()
+    if _REMOTE:
+        con.execute("INSTALL httpfs; LOAD httpfs")
+    # The files total well under a megabyte, so each is read and decoded once
+    # per process; queries then scan DuckDB's own columnar tables
+    for name in _TABLES:
+        con.execute(f"CREATE TABLE {name} AS SELECT * FROM read_parquet('{_AGG}/{name}.parquet')")
+    return con
+
 
 def query(sql: str, params: list | None = None):
     """Run SQL against parquet files and return a pandas DataFrame."""
-    con = duckdb.connect()
-    return con.execute(sql, params or []).fetchdf()
+    # Sessions run on separate threads; a cursor per call keeps them isolated
+    with _get_con().cursor() as cur:
+        return cur.execute(sql, params or []).fetchdf()
+
+
+@st.cache_data(ttl=3600, show_spinner=False, max_entries=256)
+def cached_query(sql: str, params: tuple = ()):
+    """Memoized query() keyed on the SQL text and params tuple, so unchanged reruns skip DuckDB.
+
+    Parquets only change on a pipeline run (which redeploys), so the TTL just
+    bounds how stale a long-lived session can get.
+    """
+    return query(sql, list(params))
+
+
+@st.cache_data(ttl=3600, show_spinner=False, max_entries=256)
+def query_arrow(sql: str, params: tuple = ()) -> pa.Table:
+    """Memoized query returning an Arrow table — for scalar reads and tables
+    handed straight to st.dataframe, which don't need pandas."""
+    with _get_con().cursor() as cur:
+        return cur.execute(sql, list(params)).fetch_arrow_table()
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _name_list(name: str) -> list[str]:
+    """Sorted name list the pipeline writes next to the parquets (e.g. cip_depts.json)."""
+    # read_text goes through DuckDB so remote (httpfs) aggregates work too
+    with _get_con().cursor() as cur:
+        return json.loads(cur.execute("SELECT content FROM read_text(?)", [f"{_AGG}/{name}.json"]).fetchone()[0])
 
 
 # ── Sidebar filters ──
@@ -38,29 +207,22 @@ st.sidebar.title("Filters")
 
 @st.cache_data(ttl=3600)
 def _sidebar_options():
-    years = sorted(query(f"""
-        SELECT DISTINCT fiscal_year FROM '{_AGG}/dept_budget_trends.parquet'
-        WHERE fiscal_year IS NOT NULL
-        ORDER BY fiscal_year
-    """)["fiscal_year"].tolist())
-
-    cycles = sorted(query(f"""
-        SELECT DISTINCT budget_cycle FROM '{_AGG}/dept_budget_trends.parquet'
-        WHERE budget_cycle IS NOT NULL
-        ORDER BY budget_cycle
-    """)["budget_cycle"].tolist())
-
-    fund_types = query(f"""
-        SELECT DISTINCT fund_type FROM '{_AGG}/fund_allocation.parquet'
-        WHERE fund_type IS NOT NULL
-        ORDER BY fund_type
-    """)["fund_type"].tolist()
-
-    dept_groups = query(f"""
-        SELECT DISTINCT dept_group FROM '{_AGG}/dept_budget_trends.parquet'
-        WHERE dept_group IS NOT NULL
-        ORDER BY dept_group
-    """)["dept_group"].tolist()
+    # One scan per file, all distinct lists collected in a single pass
+    with _get_con().cursor() as cur:
+        years, cycles, dept_groups = cur.execute("""
+            SELECT
+                list(DISTINCT fiscal_year ORDER BY fiscal_year)
+                    FILTER (WHERE fiscal_year IS NOT NULL),
+                list(DISTINCT budget_cycle ORDER BY budget_cycle)
+                    FILTER (WHERE budget_cycle IS NOT NULL),
+                list(DISTINCT dept_group ORDER BY dept_group)
+                    FILTER (WHERE dept_group IS NOT NULL)
+            FROM dept_budget_trends
+        """).fetchone()
+        fund_types = cur.execute("""
+            SELECT list(DISTINCT fund_type ORDER BY fund_type) FILTER (WHERE fund_type IS NOT NULL)
+            FROM fund_allocation
+        """).fetchone()[0]
 
     return years, cycles, fund_types, dept_groups
 
@@ -114,8 +276,8 @@ selected_dept_groups = st.sidebar.multiselect(
 )
 
 st.sidebar.caption(
-    "**Year Range** applies to all tabs. **Fund Type** and **Dept Group** "
-    "primarily affect the Overview tab. Money Flow has its own year picker."
+    "**Year Range** applies to all sections. **Fund Type** and **Dept Group** "
+    "primarily affect the Overview section. Money Flow has its own year picker."
 )
 
 
@@ -127,28 +289,33 @@ def _where_clause(
     *,
     has_fund_type: bool = True,
     has_dept_group: bool = True,
-) -> str:
-    """Build WHERE clause from sidebar filter selections.
+) -> tuple[str, tuple]:
+    """Build a parameterized WHERE clause from sidebar filter selections.
 
-    Set has_fund_type=False or has_dept_group=False when querying
-    parquets that don't have those columns.
+    Returns the SQL fragment and its ``?`` parameters, in order. Set
+    has_fund_type=False or has_dept_group=False when querying parquets
+    that don't have those columns.
     """
-    clauses = [f"fiscal_year BETWEEN {yr[0]} AND {yr[1]}"]
+    clauses = ["fiscal_year BETWEEN ? AND ?"]
+    params: list = [yr[0], yr[1]]
     if cycle != "All":
-        clauses.append(f"budget_cycle = '{cycle.replace(chr(39), chr(39)*2)}'")
+        clauses.append("budget_cycle = ?")
+        params.append(cycle)
     if fund_types and has_fund_type:
-        escaped = ", ".join(f"'{t.replace(chr(39), chr(39)*2)}'" for t in fund_types)
-        clauses.append(f"fund_type IN ({escaped})")
+        clauses.append("fund_type = ANY(?)")
+        params.append(tuple(fund_types))
     if dept_groups and has_dept_group:
-        escaped = ", ".join(f"'{g.replace(chr(39), chr(39)*2)}'" for g in dept_groups)
-        clauses.append(f"dept_group IN ({escaped})")
-    return "WHERE " + " AND ".join(clauses)
+        clauses.append("dept_group = ANY(?)")
+        params.append(tuple(dept_groups))
+    return "WHERE " + " AND ".join(clauses), tuple(params)
 
 
-WHERE = _where_clause()
-WHERE_NO_DEPT = _where_clause(has_dept_group=False)
-WHERE_NO_FUND = _where_clause(has_fund_type=False)
-WHERE_NO_BOTH = _where_clause(has_fund_type=False, has_dept_group=False)
+WHERE, PARAMS = _where_clause()
+WHERE_NO_DEPT, PARAMS_NO_DEPT = _where_clause(has_dept_group=False)
+WHERE_NO_FUND, PARAMS_NO_FUND = _where_clause(has_fund_type=False)
+WHERE_NO_BOTH, PARAMS_NO_BOTH = _where_clause(has_fund_type=False, has_dept_group=False)
+# Bounds for sections that filter on the year range alone
+YEAR_PARAMS = (int(year_range[0]), int(year_range[1]))
 
 # ── Header ──
 st.title("San Diego City Budget")
@@ -160,14 +327,22 @@ st.markdown(
 )
 
 # ==================================================================
-# Tab layout
+# Section layout — st.tabs runs every tab body on every rerun, so sections
+# are picked with a radio and only the selected one executes its queries
 # ==================================================================
-tab_sankey, tab_overview, tab_bva, tab_trends, tab_cip, tab_deep = st.tabs(
-    ["Money Flow", "Overview", "Budget vs Actuals", "Trends", "Capital Projects", "Deep Dive"]
+section = st.radio(
+    "Section",
+    ["Money Flow", "Overview", "Budget vs Actuals", "Trends", "Capital Projects", "Deep Dive"],
+    horizontal=True,
+    key="section",
+    label_visibility="collapsed",
 )
 
-# ── TAB 1: Money Flow (Sankey) ──
-with tab_sankey:
+
+# ── SECTION 1: Money Flow (Sankey) ──
+@st.fragment
+def _money_flow_section() -> None:
+    """Money Flow section — a fragment, so the year picker reruns only this body."""
     st.subheader("Where Does Your Tax Dollar Go?")
     st.caption(
         "Revenue sources (left) flow through fund types (middle) into department spending (right). "
@@ -176,105 +351,121 @@ with tab_sankey:
     )
 
     # Sankey is a single-year snapshot — give it its own year picker
-    available_sankey_years = sorted(query(f"""
-        SELECT DISTINCT fiscal_year FROM '{_AGG}/sankey_revenue.parquet'
+    available_sankey_years = cached_query("""
+        SELECT DISTINCT fiscal_year FROM sankey_revenue
         ORDER BY fiscal_year
-    """)["fiscal_year"].tolist())
+    """)["fiscal_year"].tolist()
     default_idx = len(available_sankey_years) - 1 if available_sankey_years else 0
     sankey_year = st.selectbox(
         "Fiscal Year",
         options=available_sankey_years,
         index=default_idx,
-        help="The Sankey diagram shows one year at a time. Other tabs use the sidebar year range.",
+        help="The Sankey diagram shows one year at a time. Other sections use the sidebar year range.",
     )
     sankey_cycle = budget_cycle if budget_cycle != "All" else "adopted"
+    sankey_params = (sankey_year, sankey_cycle)
+
+    # Rows are already one per link per (year, cycle) — see pipeline/transform.py.
+    # Beyond _SANKEY_MAX_NODES sources / dept groups the smallest collapse into
+    # one "Other" node, so the SVG stays small; the GROUP BY only merges those.
 
     # Layer 1: revenue source → fund type (from revenue records)
-    layer1 = query(f"""
-        SELECT revenue_source, fund_type, SUM(amount) AS amount
-        FROM '{_AGG}/sankey_revenue.parquet'
-        WHERE fiscal_year = {sankey_year}
-          AND budget_cycle = '{sankey_cycle}'
-        GROUP BY revenue_source, fund_type
-        HAVING SUM(amount) > 0
+    layer1 = cached_query(f"""
+        WITH links AS (
+            SELECT revenue_source, fund_type, amount
+            FROM sankey_revenue
+            WHERE fiscal_year = ?
+              AND budget_cycle = ?
+              AND amount > 0
+        ),
+        top_nodes AS (
+            SELECT revenue_source FROM links
+            GROUP BY revenue_source
+            ORDER BY SUM(amount) DESC
+            LIMIT {_SANKEY_MAX_NODES}
+        )
+        SELECT
+            CASE WHEN revenue_source IN (SELECT revenue_source FROM top_nodes)
+                 THEN revenue_source ELSE 'Other sources' END AS revenue_source,
+            fund_type,
+            SUM(amount) AS amount
+        FROM links
+        GROUP BY ALL
         ORDER BY amount DESC
-    """)
+    """, sankey_params)
 
     # Layer 2: fund type → dept group (from expense records)
-    layer2 = query(f"""
-        SELECT fund_type, dept_group, SUM(amount) AS amount
-        FROM '{_AGG}/sankey_expense.parquet'
-        WHERE fiscal_year = {sankey_year}
-          AND budget_cycle = '{sankey_cycle}'
-        GROUP BY fund_type, dept_group
-        HAVING SUM(amount) > 0
+    layer2 = cached_query(f"""
+        WITH links AS (
+            SELECT fund_type, dept_group, amount
+            FROM sankey_expense
+            WHERE fiscal_year = ?
+              AND budget_cycle = ?
+              AND amount > 0
+        ),
+        top_nodes AS (
+            SELECT dept_group FROM links
+            GROUP BY dept_group
+            ORDER BY SUM(amount) DESC
+            LIMIT {_SANKEY_MAX_NODES}
+        )
+        SELECT
+            fund_type,
+            CASE WHEN dept_group IN (SELECT dept_group FROM top_nodes)
+                 THEN dept_group ELSE 'Other departments' END AS dept_group,
+            SUM(amount) AS amount
+        FROM links
+        GROUP BY ALL
         ORDER BY amount DESC
-    """)
+    """, sankey_params)
 
     if layer1.empty and layer2.empty:
         st.info(f"No Sankey data available for FY{sankey_year} ({sankey_cycle}).")
     else:
         # Build node labels: revenue sources + fund types + dept groups
-        rev_sources = layer1["revenue_source"].unique().tolist() if not layer1.empty else []
-        fund_types_l1 = set(layer1["fund_type"].unique()) if not layer1.empty else set()
-        fund_types_l2 = set(layer2["fund_type"].unique()) if not layer2.empty else set()
-        fund_types_s = sorted(fund_types_l1 | fund_types_l2)
-        dept_groups_s = layer2["dept_group"].unique().tolist() if not layer2.empty else []
+        # (sources and dept groups keep amount order; fund types are sorted)
+        rev_sources = layer1["revenue_source"].unique().tolist()
+        fund_types_s = np.union1d(
+            layer1["fund_type"].to_numpy(), layer2["fund_type"].to_numpy()
+        ).tolist()
+        dept_groups_s = layer2["dept_group"].unique().tolist()
 
         labels = rev_sources + fund_types_s + dept_groups_s
-        label_idx = {name: i for i, name in enumerate(labels)}
-
-        sources = (
-            [label_idx[r] for r in layer1["revenue_source"]]
-            + [label_idx[f] for f in layer2["fund_type"]]
-        )
-        targets = (
-            [label_idx[f] for f in layer1["fund_type"]]
-            + [label_idx[d] for d in layer2["dept_group"]]
-        )
-        values = layer1["amount"].tolist() + layer2["amount"].tolist()
-
-        # Distinct color per node — revenue greens, fund blues, dept warm tones
-        _rev_palette = [
-            "#2ecc71", "#27ae60", "#1abc9c", "#16a085", "#3498db",
-            "#2980b9", "#0097a7", "#00897b", "#43a047", "#66bb6a",
-            "#4db6ac", "#26a69a", "#81c784",
-        ]
-        _fund_palette = [
-            "#5c6bc0", "#42a5f5", "#7e57c2", "#5e35b1",
-            "#3949ab", "#1e88e5", "#039be5",
-        ]
-        _dept_palette = [
-            "#ef5350", "#ec407a", "#ab47bc", "#ff7043",
-            "#ffa726", "#ffca28", "#d4e157", "#66bb6a",
-            "#26c6da", "#78909c", "#8d6e63", "#f06292",
-            "#ba68c8", "#ff8a65", "#ffb74d", "#fff176",
-            "#aed581", "#4db6ac", "#4dd0e1", "#90a4ae",
-            "#a1887f", "#e57373", "#f48fb1", "#ce93d8",
-            "#ffab91", "#ffe082", "#c5e1a5", "#80cbc4",
-            "#80deea", "#b0bec5", "#bcaaa4", "#ef9a9a",
-            "#f8bbd0", "#d1c4e9", "#ffccbc", "#fff9c4",
-            "#dcedc8", "#b2dfdb", "#b2ebf2", "#cfd8dc",
-            "#d7ccc8", "#e0e0e0", "#f5f5f5", "#ffcdd2",
-            "#e1bee7", "#c5cae9", "#bbdefb", "#b3e5fc",
-            "#b2ebf2", "#b2dfdb", "#c8e6c9", "#f0f4c3",
-            "#fff9c4", "#ffecb3", "#ffe0b2", "#ffccbc",
-        ]
-
+        # Each column gets its own index range, so a name shared by a
+        # revenue source and a dept group still maps to two distinct nodes
+        fund_offset = len(rev_sources)
+        dept_offset = fund_offset + len(fund_types_s)
+
+        def _idx(col, names, offset):
+            codes = col.astype(pd.CategoricalDtype(categories=names)).cat.codes
+            return codes.to_numpy(dtype=np.int64) + offset
+
+        sources = np.concatenate([
+            _idx(layer1["revenue_source"], rev_sources, 0),
+            _idx(layer2["fund_type"], fund_types_s, fund_offset),
+        ])
+        targets = np.concatenate([
+            _idx(layer1["fund_type"], fund_types_s, fund_offset),
+            _idx(layer2["dept_group"], dept_groups_s, dept_offset),
+        ])
+        values = np.concatenate([layer1["amount"].to_numpy(), layer2["amount"].to_numpy()]).astype(np.float32)
+
+        # Distinct color per node; each link is a semi-transparent version
+        # of its source node's color
         node_colors = (
-            [_rev_palette[i % len(_rev_palette)] for i in range(len(rev_sources))]
-            + [_fund_palette[i % len(_fund_palette)] for i in range(len(fund_types_s))]
-            + [_dept_palette[i % len(_dept_palette)] for i in range(len(dept_groups_s))]
+            _cycle(_REV_PALETTE, len(rev_sources))
+            + _cycle(_FUND_PALETTE, len(fund_types_s))
+            + _cycle(_DEPT_PALETTE, len(dept_groups_s))
         )
-
-        # Link colors: semi-transparent version of the source node color
-        def _to_rgba(hex_color: str, alpha: float = 0.35) -> str:
-            r, g, b = int(hex_color[1:3], 16), int(hex_color[3:5], 16), int(hex_color[5:7], 16)
-            return f"rgba({r},{g},{b},{alpha})"
-
-        link_colors = [_to_rgba(node_colors[s]) for s in sources]
+        node_rgba = np.array(
+            _cycle(_REV_PALETTE_RGBA, len(rev_sources))
+            + _cycle(_FUND_PALETTE_RGBA, len(fund_types_s))
+            + _cycle(_DEPT_PALETTE_RGBA, len(dept_groups_s))
+        )
+        link_colors = node_rgba[sources].tolist()
 
         fig = go.Figure(go.Sankey(
+            arrangement="snap",
             textfont=dict(size=14, color="white", family="sans-serif"),
             node=dict(
                 pad=15,
@@ -289,8 +480,10 @@ with tab_sankey:
                 color=link_colors,
             ),
         ))
+        # Grow with the tallest column so crowded years keep readable nodes
+        tallest = max(len(rev_sources), len(fund_types_s), len(dept_groups_s))
         fig.update_layout(
-            height=650,
+            height=max(650, 16 * tallest),
             margin=dict(l=10, r=10, t=10, b=10),
             paper_bgcolor="rgba(0,0,0,0)",
             plot_bgcolor="rgba(0,0,0,0)",
@@ -314,88 +507,33 @@ with tab_sankey:
     with st.expander("What do these labels mean?"):
         gl, gm, gr = st.columns(3)
         with gl:
-            st.markdown("""**Revenue Sources** (left)
-
-Where the money comes from:
-- **Charges for Current Services** — fees for city services: water/sewer bills, permits, recreation fees, parking
-- **Property Tax Revenue** — taxes on real estate (the city's single largest General Fund source)
-- **Other Revenue** — miscellaneous: asset sales, reimbursements, prior-year adjustments
-- **Sales Taxes** — the city's local share of California state sales tax (Bradley-Burns 1%)
-- **Transfers In** — money moved between city funds (e.g. General Fund transferring to a capital project fund)
-- **Other Local Taxes** — franchise fees paid by SDG&E, cable companies, property transfer tax
-- **Transient Occupancy Taxes** — 10.5% tax on hotel and short-term rental stays
-- **Licenses and Permits** — building permits, business licenses, encroachment permits
-- **Revenue from Use of Money & Property** — rents, concessions, interest income (e.g. Mission Bay leases)
-- **Fines, Forfeitures & Penalties** — parking citations, code enforcement fines, court penalties
-- **Revenue from Other Agencies** — state/county shared revenue, motor vehicle license fees
-- **Revenue from Federal Agencies** — federal grants and reimbursements
-- **Special Assessments** — charges on specific properties for local improvements (lighting, landscaping)
-""")
+            st.markdown(_REV_GLOSSARY_MD)
         with gm:
-            st.markdown("""**Fund Types** (middle)
-
-How money is organized:
-- **Enterprise Funds** — self-supporting services funded by user fees, not taxes. Includes water, sewer, airports, golf courses, refuse, and Development Services. The largest fund type by far.
-- **General Fund** — the city's main discretionary account funded by taxes. Pays for police, fire, parks, libraries, and most city services residents interact with.
-- **Special Revenue Funds** — legally earmarked for specific purposes. Includes gas tax (roads), Maintenance Assessment Districts (neighborhood upkeep), parking meter revenue, and transient occupancy tax.
-- **Internal Service Funds** — departments that provide shared services and bill other departments. Includes Fleet Operations, IT, energy conservation, and central stores.
-- **Capital Project Funds** — funding for long-term infrastructure: buildings, roads, water/sewer pipes, parks. Often funded by bonds or developer impact fees.
-- **Debt Service and Tax Funds** — payments on bonds and short-term borrowing (Tax and Revenue Anticipation Notes).
-""")
+            st.markdown(_FUND_GLOSSARY_MD)
         with gr:
-            st.markdown("""**Department Groups** (right)
-
-Who spends the money:
-- **Public Utilities** — water and sewer systems, the city's largest operation (~$1.2B, almost entirely enterprise funds from ratepayer bills)
-- **Police** — law enforcement, the largest General Fund department (~$680M)
-- **Fire-Rescue** — fire suppression, EMS/ambulance, lifeguards, community risk reduction (~$480M)
-- **Parks & Recreation** — 400+ parks, rec centers, Balboa Park, Mission Bay Park, open space
-- **Citywide Program Expenditures** — citywide costs not tied to one department: pension obligations, retiree health care, citywide contracts
-- **Environmental Services** — waste collection, recycling, landfills, environmental compliance
-- **Transportation** — street maintenance, traffic signals, streetlights, transit coordination
-- **General Services** — facilities maintenance, security, fleet operations, building management
-- **Engineering & Capital Projects** — design and construction of city infrastructure
-- **Special Promotional Programs** — tourism marketing, convention center promotion (funded by hotel tax)
-- **Citywide Other/Special Funds** — debt service, insurance reserves, special fund expenditures
-- **Development Services** — building permits, plan review, code enforcement (enterprise fund)
-- **Dept. of Information Technology** — citywide IT infrastructure, systems, cybersecurity
-- **City Attorney** — legal counsel, litigation, prosecution
-- **Library** — 36 branch libraries and the Central Library
-- **Stormwater** — storm drain maintenance, water quality, flood control
-- **Homelessness Strategies & Solutions** — shelters, outreach, housing programs
-- **Real Estate & Airport Management** — city-owned properties, airport operations
-- **Redevelopment Agency / Housing Successor** — wind-down of dissolved redevelopment agency, affordable housing obligations
-- **City Treasurer** — investment management, debt administration
-- **Other departments** — City Council, Planning, Purchasing & Contracting, Economic Development, Sustainability & Mobility, Risk Management, Human Resources, City Clerk, and more
-""")
+            st.markdown(_DEPT_GLOSSARY_MD)
 
-# ── TAB 2: Overview ──
-with tab_overview:
-    # KPI row
-    kpi_expense = query(f"""
-        SELECT SUM(amount) AS total
-        FROM '{_AGG}/dept_budget_trends.parquet'
-        {WHERE_NO_FUND} AND source = 'budget' AND revenue_or_expense = 'Expense'
-    """)
-    kpi_revenue = query(f"""
-        SELECT SUM(amount) AS total
-        FROM '{_AGG}/revenue_breakdown.parquet'
-        {WHERE_NO_BOTH} AND source = 'budget'
-    """)
-    kpi_gf = query(f"""
-        SELECT SUM(amount) AS total
-        FROM '{_AGG}/fund_allocation.parquet'
-        {WHERE_NO_DEPT} AND fund_type = 'General Fund' AND source = 'budget'
-          AND revenue_or_expense = 'Expense'
-    """)
 
-    total_expense = kpi_expense["total"].iloc[0] if not kpi_expense.empty else 0
-    total_revenue = kpi_revenue["total"].iloc[0] if not kpi_revenue.empty else 0
-    total_gf = kpi_gf["total"].iloc[0] if not kpi_gf.empty else 0
+if section == "Money Flow":
+    _money_flow_section()
 
-    total_expense = total_expense if total_expense else 0
-    total_revenue = total_revenue if total_revenue else 0
-    total_gf = total_gf if total_gf else 0
+# ── SECTION 2: Overview ──
+if section == "Overview":
+    # KPI row — one statement, three scalar subqueries
+    kpis = query_arrow(f"""
+        SELECT
+            (SELECT COALESCE(SUM(amount), 0) FROM dept_budget_trends
+             {WHERE_NO_FUND} AND source = 'budget' AND revenue_or_expense = 'Expense') AS expense,
+            (SELECT COALESCE(SUM(amount), 0) FROM revenue_breakdown
+             {WHERE_NO_BOTH} AND source = 'budget') AS revenue,
+            (SELECT COALESCE(SUM(amount), 0) FROM fund_allocation
+             {WHERE_NO_DEPT} AND fund_type = 'General Fund' AND source = 'budget'
+               AND revenue_or_expense = 'Expense') AS gf
+    """, PARAMS_NO_FUND + PARAMS_NO_BOTH + PARAMS_NO_DEPT)
+
+    total_expense = kpis.column("expense")[0].as_py()
+    total_revenue = kpis.column("revenue")[0].as_py()
+    total_gf = kpis.column("gf")[0].as_py()
 
     col1, col2, col3 = st.columns(3)
     col1.metric("Total Budget (Expense)", f"${total_expense / 1e9:.2f}B" if total_expense else "N/A")
@@ -410,59 +548,60 @@ with tab_overview:
 
     with chart_left:
         st.subheader("Top 10 Departments by Spending")
-        top_dept = query(f"""
+        top_dept = cached_query(f"""
             SELECT dept_name AS "Department", SUM(amount) AS "Amount"
-            FROM '{_AGG}/dept_budget_trends.parquet'
+            FROM dept_budget_trends
             {WHERE_NO_FUND} AND source = 'budget' AND revenue_or_expense = 'Expense'
             GROUP BY dept_name
             ORDER BY "Amount" DESC
             LIMIT 10
-        """)
+        """, PARAMS_NO_FUND)
         if not top_dept.empty:
-            top_dept["Amount"] = top_dept["Amount"] / 1e6
+            top_dept["Amount"] = (top_dept["Amount"] / 1e6).astype("float32")
             st.bar_chart(top_dept.set_index("Department"), horizontal=True, y_label="Millions ($)", color=CHART_COLOR)
 
     with chart_right:
         st.subheader("Spending by Fund Type")
-        fund_dist = query(f"""
+        fund_dist = cached_query(f"""
             SELECT fund_type AS "Fund Type", SUM(amount) AS "Amount"
-            FROM '{_AGG}/fund_allocation.parquet'
+            FROM fund_allocation
             {WHERE_NO_DEPT} AND source = 'budget' AND revenue_or_expense = 'Expense'
             GROUP BY fund_type
             ORDER BY "Amount" DESC
-        """)
+        """, PARAMS_NO_DEPT)
         if not fund_dist.empty:
-            fund_dist["Amount"] = fund_dist["Amount"] / 1e6
+            fund_dist["Amount"] = (fund_dist["Amount"] / 1e6).astype("float32")
             st.bar_chart(fund_dist.set_index("Fund Type"), horizontal=True, y_label="Millions ($)", color=CHART_COLOR)
-            st.caption("For capital project details, see the **Capital Projects** tab.")
+            st.caption("For capital project details, see the **Capital Projects** section.")
 
     # Revenue sources
     st.subheader("Revenue Sources")
-    rev_src = query(f"""
+    rev_src = cached_query(f"""
         SELECT account_type AS "Revenue Source", SUM(amount) AS "Amount"
-        FROM '{_AGG}/revenue_breakdown.parquet'
+        FROM revenue_breakdown
         {WHERE_NO_BOTH} AND source = 'budget'
         GROUP BY account_type
         ORDER BY "Amount" DESC
-    """)
+    """, PARAMS_NO_BOTH)
     if not rev_src.empty:
-        rev_src["Amount"] = rev_src["Amount"] / 1e6
+        rev_src["Amount"] = (rev_src["Amount"] / 1e6).astype("float32")
         st.bar_chart(rev_src.set_index("Revenue Source"), horizontal=True, y_label="Millions ($)", color=CHART_COLOR)
 
     # Department breakdown table
     with st.expander("Full Department Breakdown"):
-        detail = query(f"""
+        # Straight to st.dataframe, so keep it as Arrow (no pandas copy)
+        detail = query_arrow(f"""
             SELECT
                 dept_name AS "Department",
                 dept_division AS "Division",
                 account_class AS "Category",
                 SUM(amount) AS "Budget ($)"
-            FROM '{_AGG}/dept_detail.parquet'
+            FROM dept_detail
             {WHERE_NO_FUND} AND source = 'budget' AND revenue_or_expense = 'Expense'
             GROUP BY dept_name, dept_division, account_class
             ORDER BY dept_name, "Budget ($)" DESC
-        """)
-        if not detail.empty:
+        """, PARAMS_NO_FUND)
+        if detail.num_rows:
             st.dataframe(
                 detail,
                 use_container_width=True,
@@ -474,8 +613,8 @@ with tab_overview:
                 },
             )
 
-# ── TAB 3: Budget vs Actuals ──
-with tab_bva:
+# ── SECTION 3: Budget vs Actuals ──
+if section == "Budget vs Actuals":
     st.subheader("Budget vs Actual Spending")
     st.caption(
         "Compares adopted budget to actual spending. Actuals are only available through FY2023 "
@@ -483,20 +622,31 @@ with tab_bva:
         "open data portal. This can lag 12-18+ months behind the current fiscal year."
     )
 
-    bva = query(f"""
-        SELECT
-            dept_name,
-            SUM(budget_amount) AS budget_total,
-            SUM(actual_amount) AS actual_total,
-            SUM(actual_amount) - SUM(budget_amount) AS variance
-        FROM '{_AGG}/budget_vs_actuals.parquet'
-        WHERE fiscal_year BETWEEN {year_range[0]} AND {year_range[1]}
-          AND account_type IN ('Personnel', 'Non-Personnel')
-        GROUP BY dept_name
-        HAVING SUM(budget_amount) != 0
-        ORDER BY SUM(budget_amount) DESC
-        LIMIT 15
-    """)
+    # One scan ranks each department both ways: top 15 by budget feed the
+    # chart, top 15 by |variance| feed the over/under table
+    bva_ranked = cached_query("""
+        WITH agg AS (
+            SELECT
+                dept_name,
+                SUM(budget_amount) AS budget_total,
+                SUM(actual_amount) AS actual_total,
+                SUM(actual_amount) - SUM(budget_amount) AS variance
+            FROM budget_vs_actuals
+            WHERE fiscal_year BETWEEN ? AND ?
+              AND account_type IN ('Personnel', 'Non-Personnel')
+            GROUP BY dept_name
+            HAVING SUM(budget_amount) != 0
+        )
+        SELECT * FROM (
+            SELECT
+                *,
+                row_number() OVER (ORDER BY budget_total DESC) AS budget_rank,
+                row_number() OVER (ORDER BY ABS(variance) DESC) AS variance_rank
+            FROM agg
+        )
+        WHERE budget_rank <= 15 OR variance_rank <= 15
+    """, YEAR_PARAMS)
+    bva = bva_ranked[bva_ranked["budget_rank"] <= 15].sort_values("budget_rank")
 
     if bva.empty:
         st.info("No budget vs actuals data available for the selected filters.")
@@ -513,8 +663,8 @@ with tab_bva:
 
         # Side-by-side bar
         chart_data = bva[["dept_name", "budget_total", "actual_total"]].copy()
-        chart_data["budget_total"] = chart_data["budget_total"] / 1e6
-        chart_data["actual_total"] = chart_data["actual_total"] / 1e6
+        chart_data["budget_total"] = (chart_data["budget_total"] / 1e6).astype("float32")
+        chart_data["actual_total"] = (chart_data["actual_total"] / 1e6).astype("float32")
         chart_data = chart_data.rename(columns={
             "dept_name": "Department",
             "budget_total": "Budget ($M)",
@@ -524,105 +674,133 @@ with tab_bva:
 
     # Over/under spends
     st.subheader("Biggest Over/Under Spends")
-    variance = query(f"""
-        SELECT
-            dept_name AS "Department",
-            SUM(budget_amount) AS "Budget",
-            SUM(actual_amount) AS "Actual",
-            SUM(actual_amount) - SUM(budget_amount) AS "Over/Under"
-        FROM '{_AGG}/budget_vs_actuals.parquet'
-        WHERE fiscal_year BETWEEN {year_range[0]} AND {year_range[1]}
-          AND account_type IN ('Personnel', 'Non-Personnel')
-        GROUP BY dept_name
-        HAVING SUM(budget_amount) != 0
-        ORDER BY ABS(SUM(actual_amount) - SUM(budget_amount)) DESC
-        LIMIT 15
-    """)
+    variance = (
+        bva_ranked[bva_ranked["variance_rank"] <= 15]
+        .sort_values("variance_rank")
+        .rename(columns={
+            "dept_name": "Department",
+            "budget_total": "Budget",
+            "actual_total": "Actual",
+            "variance": "Over/Under",
+        })[["Department", "Budget", "Actual", "Over/Under"]]
+    )
     if not variance.empty:
-        for col_name in ["Budget", "Actual", "Over/Under"]:
-            variance[col_name] = variance[col_name].apply(lambda x: f"${x:,.0f}")
-        st.dataframe(variance, use_container_width=True, hide_index=True)
+        st.dataframe(
+            variance,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Budget": st.column_config.NumberColumn("Budget", format="$ %.0f"),
+                "Actual": st.column_config.NumberColumn("Actual", format="$ %.0f"),
+                "Over/Under": st.column_config.NumberColumn("Over/Under", format="$ %+.0f"),
+            },
+        )
 
-# ── TAB 4: Trends ──
-with tab_trends:
+# ── SECTION 4: Trends ──
+if section == "Trends":
     st.subheader("Revenue vs Expense Budget Over Time")
-    rev_vs_exp = query(f"""
-        SELECT
-            fiscal_year,
-            revenue_or_expense,
-            SUM(amount) / 1e9 AS amount_b
-        FROM '{_AGG}/dept_budget_trends.parquet'
-        WHERE fiscal_year BETWEEN {year_range[0]} AND {year_range[1]}
-          AND source = 'budget' AND budget_cycle = 'adopted'
-          AND revenue_or_expense IS NOT NULL
-        GROUP BY fiscal_year, revenue_or_expense
-        ORDER BY fiscal_year
-    """)
-    if not rev_vs_exp.empty:
-        rev_exp_pivot = rev_vs_exp.pivot_table(
-            index="fiscal_year", columns="revenue_or_expense", values="amount_b", fill_value=0
+    # PIVOT only takes parameters in its source when the ON values are
+    # listed, so the pivots below name their columns up front
+    rev_exp_pivot = cached_query("""
+        PIVOT (
+            SELECT fiscal_year, revenue_or_expense, amount
+            FROM dept_budget_trends
+            WHERE fiscal_year BETWEEN ? AND ?
+              AND source = 'budget' AND budget_cycle = 'adopted'
+              AND revenue_or_expense IS NOT NULL
         )
+        ON revenue_or_expense IN ('Expense', 'Revenue') USING (SUM(amount) / 1e9)::FLOAT
+        GROUP BY fiscal_year
+        ORDER BY fiscal_year
+    """, YEAR_PARAMS)
+    if not rev_exp_pivot.empty:
+        rev_exp_pivot = rev_exp_pivot.set_index("fiscal_year").fillna(0)
         rev_exp_pivot.index = rev_exp_pivot.index.astype(str)
         st.line_chart(rev_exp_pivot, color=[CHART_COLOR, "#2a6496"], y_label="Billions ($)")
 
     # Department group trends
     st.subheader("Spending by Department Group")
-    dept_trend = query(f"""
-        SELECT fiscal_year, dept_group, SUM(amount) / 1e6 AS amount_m
-        FROM '{_AGG}/dept_budget_trends.parquet'
-        WHERE fiscal_year BETWEEN {year_range[0]} AND {year_range[1]}
+    # Top 10 dept groups by total, pivoted to one column per group in DuckDB
+    trend_filter = """
+        fiscal_year BETWEEN ? AND ?
           AND source = 'budget' AND budget_cycle = 'adopted'
           AND revenue_or_expense = 'Expense'
           AND dept_group IS NOT NULL
-        GROUP BY fiscal_year, dept_group
-        ORDER BY fiscal_year
-    """)
-    if not dept_trend.empty:
-        pivot = dept_trend.pivot_table(
-            index="fiscal_year", columns="dept_group", values="amount_m", fill_value=0
-        )
-        # Keep only top 10 dept groups by total
-        top_groups = pivot.sum().nlargest(10).index.tolist()
-        pivot = pivot[top_groups]
+    """
+    top_groups = cached_query(f"""
+        SELECT dept_group FROM dept_budget_trends
+        WHERE {trend_filter}
+        GROUP BY dept_group
+        ORDER BY SUM(amount) DESC
+        LIMIT 10
+    """, YEAR_PARAMS)["dept_group"].tolist()
+    if top_groups:
+        pivot = cached_query(f"""
+            PIVOT (
+                SELECT fiscal_year, dept_group, amount
+                FROM dept_budget_trends
+                WHERE {trend_filter}
+            )
+            ON dept_group IN ({", ".join("?" * len(top_groups))}) USING (SUM(amount) / 1e6)::FLOAT
+            GROUP BY fiscal_year
+            ORDER BY fiscal_year
+        """, (*YEAR_PARAMS, *top_groups))
+        pivot = pivot.set_index("fiscal_year").fillna(0)
+        # Largest group first, as the stacking order
+        pivot = pivot[pivot.sum().sort_values(ascending=False).index]
         pivot.index = pivot.index.astype(str)
         st.area_chart(pivot)
 
     # Revenue trend
     st.subheader("Revenue by Source Over Time")
-    rev_trend = query(f"""
-        SELECT fiscal_year, account_type, SUM(amount) / 1e6 AS amount_m
-        FROM '{_AGG}/revenue_breakdown.parquet'
-        WHERE fiscal_year BETWEEN {year_range[0]} AND {year_range[1]}
+    # Top 8 sources by total, pivoted in DuckDB like the dept groups above
+    rev_filter = """
+        fiscal_year BETWEEN ? AND ?
           AND source = 'budget' AND budget_cycle = 'adopted'
-        GROUP BY fiscal_year, account_type
-        ORDER BY fiscal_year
-    """)
-    if not rev_trend.empty:
-        rev_pivot = rev_trend.pivot_table(
-            index="fiscal_year", columns="account_type", values="amount_m", fill_value=0
-        )
-        top_rev = rev_pivot.sum().nlargest(8).index.tolist()
-        rev_pivot = rev_pivot[top_rev]
+    """
+    top_sources = cached_query(f"""
+        SELECT account_type FROM revenue_breakdown
+        WHERE {rev_filter}
+        GROUP BY account_type
+        ORDER BY SUM(amount) DESC
+        LIMIT 8
+    """, YEAR_PARAMS)["account_type"].tolist()
+    if top_sources:
+        rev_pivot = cached_query(f"""
+            PIVOT (
+                SELECT fiscal_year, account_type, amount
+                FROM revenue_breakdown
+                WHERE {rev_filter}
+            )
+            ON account_type IN ({", ".join("?" * len(top_sources))}) USING (SUM(amount) / 1e6)::FLOAT
+            GROUP BY fiscal_year
+            ORDER BY fiscal_year
+        """, (*YEAR_PARAMS, *top_sources))
+        rev_pivot = rev_pivot.set_index("fiscal_year").fillna(0)
+        rev_pivot = rev_pivot[rev_pivot.sum().sort_values(ascending=False).index]
         rev_pivot.index = rev_pivot.index.astype(str)
         st.area_chart(rev_pivot)
 
     # General Fund trend
     st.subheader("General Fund Budget Over Time")
-    gf_trend = query(f"""
-        SELECT fiscal_year AS "Fiscal Year", SUM(amount) / 1e9 AS "General Fund ($B)"
-        FROM '{_AGG}/general_fund_summary.parquet'
-        WHERE fiscal_year BETWEEN {year_range[0]} AND {year_range[1]}
+    gf_trend = cached_query("""
+        SELECT fiscal_year AS "Fiscal Year", (SUM(amount) / 1e9)::FLOAT AS "General Fund ($B)"
+        FROM general_fund_summary
+        WHERE fiscal_year BETWEEN ? AND ?
           AND source = 'budget' AND budget_cycle = 'adopted'
           AND revenue_or_expense = 'Expense'
         GROUP BY fiscal_year
         ORDER BY fiscal_year
-    """)
+    """, YEAR_PARAMS)
     if not gf_trend.empty:
         gf_trend["Fiscal Year"] = gf_trend["Fiscal Year"].astype(str)
         st.line_chart(gf_trend.set_index("Fiscal Year"), color=CHART_COLOR)
 
-# ── TAB 5: Capital Projects ──
-with tab_cip:
+
+# ── SECTION 5: Capital Projects ──
+@st.fragment
+def _capital_projects_section() -> None:
+    """Capital Projects section — a fragment, so the department filter reruns only this body."""
     st.subheader("What Are We Building?")
     st.caption(
         "Capital Improvement Projects (CIP) are major infrastructure investments — "
@@ -630,56 +808,43 @@ with tab_cip:
         "These are funded separately from the operating budget."
     )
 
-    # KPI row
-    cip_totals = query(f"""
-        SELECT
-            SUM(amount) / 1e9 AS total_b,
-            count(DISTINCT project_name) AS n_projects,
-            count(DISTINCT asset_owning_dept) AS n_depts
-        FROM '{_AGG}/cip_by_dept.parquet'
-        WHERE fiscal_year BETWEEN {year_range[0]} AND {year_range[1]}
+    # One scan of cip_by_dept per render — per-project totals for the year
+    # range, from which the KPIs, bar chart, and detail table are all derived
+    cip = cached_query("""
+        SELECT asset_owning_dept, project_name, SUM(amount) AS amount
+        FROM cip_by_dept
+        WHERE fiscal_year BETWEEN ? AND ?
           AND source = 'budget'
-    """)
-    cip_top_dept = query(f"""
-        SELECT asset_owning_dept, SUM(amount) / 1e6 AS amt
-        FROM '{_AGG}/cip_by_dept.parquet'
-        WHERE fiscal_year BETWEEN {year_range[0]} AND {year_range[1]}
-          AND source = 'budget'
-        GROUP BY asset_owning_dept
-        ORDER BY amt DESC
-        LIMIT 1
-    """)
-    operating_total = query(f"""
+        GROUP BY asset_owning_dept, project_name
+    """, YEAR_PARAMS)
+    cip_by_dept = cip.groupby("asset_owning_dept")["amount"].sum().sort_values(ascending=False)
+
+    operating_total = query_arrow("""
         SELECT SUM(amount) AS total
-        FROM '{_AGG}/dept_budget_trends.parquet'
-        WHERE fiscal_year BETWEEN {year_range[0]} AND {year_range[1]}
+        FROM dept_budget_trends
+        WHERE fiscal_year BETWEEN ? AND ?
           AND source = 'budget' AND budget_cycle = 'adopted'
           AND revenue_or_expense = 'Expense'
-    """)
+    """, YEAR_PARAMS)
 
-    cip_total_val = cip_totals["total_b"].iloc[0] if not cip_totals.empty else 0
-    op_total_val = (operating_total["total"].iloc[0] or 0) / 1e9 if not operating_total.empty else 0
+    cip_total_val = cip["amount"].sum() / 1e9
+    op_total_val = (operating_total.column("total")[0].as_py() or 0) / 1e9
     combined = cip_total_val + op_total_val
     cip_pct = (cip_total_val / combined * 100) if combined > 0 else 0
 
+    # KPI row
     c1, c2, c3, c4 = st.columns(4)
-    if not cip_totals.empty:
-        c1.metric(
-            "Total CIP Budget", f"${cip_total_val:.2f}B",
-            help="Capital projects are separate from the operating budget and typically represent ~15% of total city spending.",
-        )
-        c2.metric("% of Total City Budget", f"{cip_pct:.0f}%")
-        c3.metric("Projects", f"{int(cip_totals['n_projects'].iloc[0]):,}")
-    if not cip_top_dept.empty:
-        c4.metric("Top Department", cip_top_dept["asset_owning_dept"].iloc[0])
+    c1.metric(
+        "Total CIP Budget", f"${cip_total_val:.2f}B",
+        help="Capital projects are separate from the operating budget and typically represent ~15% of total city spending.",
+    )
+    c2.metric("% of Total City Budget", f"{cip_pct:.0f}%")
+    c3.metric("Projects", f"{cip['project_name'].nunique():,}")
+    if not cip_by_dept.empty:
+        c4.metric("Top Department", cip_by_dept.index[0])
 
     # Department filter
-    cip_depts = query(f"""
-        SELECT DISTINCT asset_owning_dept
-        FROM '{_AGG}/cip_by_dept.parquet'
-        WHERE asset_owning_dept IS NOT NULL
-        ORDER BY asset_owning_dept
-    """)["asset_owning_dept"].tolist()
+    cip_depts = _name_list("cip_depts")
 
     cip_dept_filter = st.selectbox(
         "Filter by Department",
@@ -687,54 +852,34 @@ with tab_cip:
         key="cip_dept_filter",
     )
 
-    cip_dept_clause = ""
     if cip_dept_filter != "All Departments":
-        safe = cip_dept_filter.replace("'", "''")
-        cip_dept_clause = f"AND asset_owning_dept = '{safe}'"
+        cip = cip[cip["asset_owning_dept"] == cip_dept_filter]
 
     # Bar chart — projects when filtered to one dept, departments otherwise
     if cip_dept_filter != "All Departments":
-        cip_chart = query(f"""
-            SELECT project_name AS "Project", SUM(amount) / 1e6 AS "Amount ($M)"
-            FROM '{_AGG}/cip_by_dept.parquet'
-            WHERE fiscal_year BETWEEN {year_range[0]} AND {year_range[1]}
-              AND source = 'budget'
-              {cip_dept_clause}
-            GROUP BY project_name
-            ORDER BY SUM(amount) DESC
-            LIMIT 15
-        """)
+        cip_chart = cip.nlargest(15, "amount").rename(
+            columns={"project_name": "Project", "amount": "Amount ($M)"}
+        )[["Project", "Amount ($M)"]]
+        cip_chart["Amount ($M)"] = (cip_chart["Amount ($M)"] / 1e6).astype("float32")
         if not cip_chart.empty:
             st.bar_chart(cip_chart.set_index("Project"), horizontal=True, y_label="Millions ($)", color=CHART_COLOR)
     else:
-        cip_chart = query(f"""
-            SELECT asset_owning_dept AS "Department", SUM(amount) / 1e6 AS "Amount ($M)"
-            FROM '{_AGG}/cip_by_dept.parquet'
-            WHERE fiscal_year BETWEEN {year_range[0]} AND {year_range[1]}
-              AND source = 'budget'
-            GROUP BY asset_owning_dept
-            ORDER BY SUM(amount) DESC
-            LIMIT 15
-        """)
+        cip_chart = (cip_by_dept.head(15) / 1e6).astype("float32").rename("Amount ($M)").rename_axis("Department")
         if not cip_chart.empty:
-            st.bar_chart(cip_chart.set_index("Department"), horizontal=True, y_label="Millions ($)", color=CHART_COLOR)
+            st.bar_chart(cip_chart.to_frame(), horizontal=True, y_label="Millions ($)", color=CHART_COLOR)
 
     # Project detail table
     st.subheader("Project Details")
-    cip_projects = query(f"""
-        SELECT
-            asset_owning_dept AS "Department",
-            project_name AS "Project",
-            SUM(amount) / 1e6 AS "Budget ($M)"
-        FROM '{_AGG}/cip_by_dept.parquet'
-        WHERE fiscal_year BETWEEN {year_range[0]} AND {year_range[1]}
-          AND source = 'budget'
-          AND project_name IS NOT NULL
-          {cip_dept_clause}
-        GROUP BY asset_owning_dept, project_name
-        HAVING SUM(amount) > 0
-        ORDER BY SUM(amount) DESC
-    """)
+    cip_projects = (
+        cip[cip["project_name"].notna() & (cip["amount"] > 0)]
+        .sort_values("amount", ascending=False)
+        .rename(columns={
+            "asset_owning_dept": "Department",
+            "project_name": "Project",
+            "amount": "Budget ($M)",
+        })
+    )
+    cip_projects["Budget ($M)"] = cip_projects["Budget ($M)"] / 1e6
     if not cip_projects.empty:
         st.caption(f"Showing {len(cip_projects)} projects totaling ${cip_projects['Budget ($M)'].sum():,.0f}M")
         st.dataframe(
@@ -751,50 +896,59 @@ with tab_cip:
     else:
         st.info("No capital projects found for the selected filters.")
 
-# ── TAB 6: Deep Dive ──
-with tab_deep:
+
+if section == "Capital Projects":
+    _capital_projects_section()
+
+
+# ── SECTION 6: Deep Dive ──
+@st.fragment
+def _deep_dive_section() -> None:
+    """Deep Dive section — a fragment, so the department picker reruns only this body."""
     # Department drill-down
     st.subheader("Department Detail")
 
-    dept_list = query(f"""
-        SELECT DISTINCT dept_name FROM '{_AGG}/dept_detail.parquet'
-        WHERE dept_name IS NOT NULL
-        ORDER BY dept_name
-    """)["dept_name"].tolist()
+    dept_list = _name_list("dept_names")
 
     selected_dept = st.selectbox("Select Department", options=dept_list)
 
     if selected_dept:
-        dept_data = query(f"""
+        dept_data = query_arrow("""
             SELECT
                 dept_division AS "Division",
                 account_class AS "Account Class",
-                SUM(CASE WHEN source = 'budget' THEN amount ELSE 0 END) AS "Budget",
-                SUM(CASE WHEN source = 'actual' THEN amount ELSE 0 END) AS "Actual"
-            FROM '{_AGG}/dept_detail.parquet'
+                COALESCE(SUM(amount) FILTER (WHERE source = 'budget'), 0) AS "Budget",
+                COALESCE(SUM(amount) FILTER (WHERE source = 'actual'), 0) AS "Actual"
+            FROM dept_detail
             WHERE dept_name = $1
-              AND fiscal_year BETWEEN {year_range[0]} AND {year_range[1]}
+              AND fiscal_year BETWEEN $2 AND $3
               AND revenue_or_expense = 'Expense'
             GROUP BY dept_division, account_class
             ORDER BY "Budget" DESC
-        """, [selected_dept])
-        if not dept_data.empty:
-            for col_name in ["Budget", "Actual"]:
-                dept_data[col_name] = dept_data[col_name].apply(lambda x: f"${x:,.0f}")
-            st.dataframe(dept_data, use_container_width=True, hide_index=True)
+        """, (selected_dept, *YEAR_PARAMS))
+        if dept_data.num_rows:
+            st.dataframe(
+                dept_data,
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "Budget": st.column_config.NumberColumn("Budget", format="$ %.0f"),
+                    "Actual": st.column_config.NumberColumn("Actual", format="$ %.0f"),
+                },
+            )
         else:
             st.info(f"No detail data for {selected_dept} in the selected year range.")
 
     # General Fund focus
     st.subheader("General Fund — Top Departments")
-    gf_depts = query(f"""
-        SELECT dept_name AS "Department", SUM(amount) / 1e6 AS "Amount ($M)"
-        FROM '{_AGG}/general_fund_summary.parquet'
+    gf_depts = cached_query(f"""
+        SELECT dept_name AS "Department", (SUM(amount) / 1e6)::FLOAT AS "Amount ($M)"
+        FROM general_fund_summary
         {WHERE_NO_FUND} AND source = 'budget' AND revenue_or_expense = 'Expense'
         GROUP BY dept_name
         ORDER BY SUM(amount) DESC
         LIMIT 15
-    """)
+    """, PARAMS_NO_FUND)
     if not gf_depts.empty:
         st.bar_chart(gf_depts.set_index("Department"), horizontal=True, color=CHART_COLOR)
 
@@ -805,14 +959,17 @@ with tab_deep:
         "spending allocated to each council district. District-level spending data is "
         "not available in the city's open budget datasets."
     )
-    council = query(f"""
-        SELECT dept_name AS "Council Office", SUM(amount) / 1e6 AS "Budget ($M)"
-        FROM '{_AGG}/council_offices.parquet'
-        WHERE fiscal_year BETWEEN {year_range[0]} AND {year_range[1]}
+    council = cached_query("""
+        SELECT dept_name AS "Council Office", (SUM(amount) / 1e6)::FLOAT AS "Budget ($M)"
+        FROM council_offices
+        WHERE fiscal_year BETWEEN ? AND ?
           AND source = 'budget'
         GROUP BY dept_name
         ORDER BY dept_name
-    """)
+    """, YEAR_PARAMS)
     if not council.empty:
         st.bar_chart(council.set_index("Council Office"), horizontal=True, color=CHART_COLOR)
 
+
+if section == "Deep Dive":
+    _deep_dive_section()
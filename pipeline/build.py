@@ -1,4 +1,4 @@
-"""Orchestrator: ingest → transform → export."""
+"""Orchestrator: ingest → transform → export → validate."""
 
 from __future__ import annotations
 
@@ -7,6 +7,7 @@ import time
 
 from pipeline.ingest import ingest
 from pipeline.transform import transform
+from pipeline.validate import validate
 
 
 def main() -> None:
@@ -22,10 +23,18 @@ def main() -> None:
     print(f"  {len(paths)} files ready\n")
 
     print("── Step 2: Transform ──")
-    transform()
+    con = transform(force=force)
+
+    # Validate on the transform's connection, so its checks can read the
+    # resident operating/cip tables rather than re-decode budget.parquet
+    print("\n── Step 3: Validate ──")
+    failures = validate(con)
+    con.close()
 
     elapsed = time.time() - t0
     print(f"\nPipeline complete in {elapsed:.1f}s")
+    if failures:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -2,6 +2,10 @@
 
 from __future__ import annotations
 
+import asyncio
+import json
+import os
+from email.utils import formatdate
 from pathlib import Path
 
 import httpx
@@ -21,36 +25,75 @@ SOURCES: dict[str, str] = {
 }
 
 
-def download(name: str, url: str, *, force: bool = False) -> Path:
-    """Download a single CSV. Skips if file exists and force=False."""
+def _meta_path(dest: Path) -> Path:
+    return dest.with_name(dest.name + ".meta.json")
+
+
+def _conditional_headers(dest: Path) -> dict[str, str]:
+    """Validators for a conditional GET of an already-downloaded file."""
+    meta_path = _meta_path(dest)
+    meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    # Fall back to the file's mtime when the server sent no Last-Modified
+    headers["If-Modified-Since"] = meta.get("last_modified") or formatdate(dest.stat().st_mtime, usegmt=True)
+    return headers
+
+
+async def download(client: httpx.AsyncClient, name: str, url: str, *, force: bool = False) -> Path | None:
+    """Download a single CSV.
+
+    An existing file is revalidated with a conditional GET (ETag /
+    Last-Modified from its .meta.json sidecar) and kept on 304;
+    force=True always re-downloads. Returns None when the server answers
+    403 (the file is skipped).
+
+    The body streams into a .part file that replaces the CSV only once
+    complete, and the sidecar is rewritten after that — a failed download
+    leaves the previous CSV and its validators untouched.
+    """
     dest = RAW_DIR / f"{name}.csv"
-    if dest.exists() and not force:
-        print(f"  [skip] {name} (already exists, {dest.stat().st_size:,} bytes)")
-        return dest
+    part = dest.with_suffix(".csv.part")
+    headers = _conditional_headers(dest) if dest.exists() and not force else {}
 
     print(f"  [download] {name} ...")
-    with httpx.stream("GET", url, follow_redirects=True, timeout=300) as r:
-        r.raise_for_status()
-        with open(dest, "wb") as f:
-            for chunk in r.iter_bytes(chunk_size=1 << 20):
-                f.write(chunk)
+    try:
+        async with client.stream("GET", url, headers=headers) as r:
+            if r.status_code == 304:
+                print(f"  [skip] {name} (not modified, {dest.stat().st_size:,} bytes)")
+                return dest
+            r.raise_for_status()
+            with open(part, "wb") as f:
+                async for chunk in r.aiter_bytes(chunk_size=1 << 20):
+                    f.write(chunk)
+            meta = {"etag": r.headers.get("etag"), "last_modified": r.headers.get("last-modified")}
+        os.replace(part, dest)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code != 403:
+            raise
+        print(f"  [warn] {name}: 403 forbidden, skipping")
+        return None
+    finally:
+        part.unlink(missing_ok=True)
+    _meta_path(dest).write_text(json.dumps(meta, indent=2) + "\n")
     print(f"  [done] {name} -> {dest.stat().st_size:,} bytes")
     return dest
 
 
+async def ingest_async(*, force: bool = False) -> list[Path]:
+    """Download all source CSVs concurrently. Returns list of downloaded file paths."""
+    RAW_DIR.mkdir(parents=True, exist_ok=True)
+    async with httpx.AsyncClient(follow_redirects=True, timeout=300) as client:
+        results = await asyncio.gather(
+            *(download(client, name, url, force=force) for name, url in SOURCES.items())
+        )
+    return [p for p in results if p is not None]
+
+
 def ingest(*, force: bool = False) -> list[Path]:
     """Download all source CSVs. Returns list of downloaded file paths."""
-    RAW_DIR.mkdir(parents=True, exist_ok=True)
-    paths = []
-    for name, url in SOURCES.items():
-        try:
-            paths.append(download(name, url, force=force))
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 403:
-                print(f"  [warn] {name}: 403 forbidden, skipping")
-            else:
-                raise
-    return paths
+    return asyncio.run(ingest_async(force=force))
 
 
 if __name__ == "__main__":
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import json
 from pathlib import Path
 
 import duckdb
@@ -11,69 +12,179 @@ PROCESSED_DIR = Path(__file__).resolve().parent.parent / "data" / "processed"
 AGGREGATED_DIR = Path(__file__).resolve().parent.parent / "data" / "aggregated"
 DB_PATH = Path(__file__).resolve().parent.parent / "db" / "budget.duckdb"
 
-
-def transform(*, db_path: Path | None = None) -> None:
-    """Load raw CSVs, join with reference tables, export Parquet."""
+# Write options for the aggregated parquets. The string columns (dept_name,
+# dept_group, fund_type, ...) are highly repetitive, so DuckDB dictionary-
+# encodes them; ZSTD then shrinks each file well past the Snappy default.
+# Format V2 adds delta / byte-stream-split encodings for the numeric
+# columns, and since the files are written once per refresh and read on
+# every cold start, the slower level 10 is worth its smaller output.
+# The dashboard and API read every file whole into memory at startup, so
+# there is no year-range pruning for small row groups to serve; 100K-row
+# groups keep most files to a single group — one range request over httpfs
+# and ~14% fewer bytes than 4K-row groups. Rows are still sorted by the
+# filter columns (fiscal_year, then budget_cycle and source where present),
+# which clusters repeated values for the encoders.
+AGG_PARQUET_OPTIONS = (
+    "FORMAT PARQUET, PARQUET_VERSION V2, COMPRESSION ZSTD, COMPRESSION_LEVEL 10, ROW_GROUP_SIZE 100000"
+)
+
+# Raw CSVs each table is built from — an output older than any of these is stale
+OPERATING_CSVS = (
+    "operating_budget.csv", "operating_actuals.csv",
+    "ref_accounts.csv", "ref_departments.csv", "ref_funds.csv",
+)
+CIP_CSVS = ("cip_budget_fy.csv", "cip_actuals_fy.csv")
+
+
+def transform(*, db_path: Path | None = None, force: bool = False) -> duckdb.DuckDBPyConnection:
+    """Load raw CSVs, join with reference tables, export Parquet.
+
+    The operating and CIP tables persist in the on-disk DuckDB file. When
+    the outputs built from them are newer than their raw CSVs, the tables
+    are reused and those outputs left alone; force=True rebuilds everything
+    (e.g. after changing this module).
+
+    Returns the open connection so validation can reuse its tables; the
+    caller closes it.
+    """
     db = db_path or DB_PATH
     db.parent.mkdir(parents=True, exist_ok=True)
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
     AGGREGATED_DIR.mkdir(parents=True, exist_ok=True)
 
     con = duckdb.connect(str(db))
+    op_sources = _raw_paths(OPERATING_CSVS)
+    cip_sources = _raw_paths(CIP_CSVS)
+    processed_path = PROCESSED_DIR / "budget.parquet"
 
-    # ── Load reference tables ──
-    _load_reference_tables(con)
-
-    # ── Load and enrich operating data ──
-    _build_operating_table(con)
+    # ── Load reference tables, then load and enrich operating data ──
+    # budget.parquet is written only after both tables are rebuilt, so
+    # while it is newer than a table's CSVs the stored table is current
+    if force or not (_has_table(con, "operating") and _is_current(processed_path, op_sources)):
+        _load_reference_tables(con)
+        _build_operating_table(con)
+        # Refresh column statistics (distinct counts) before the rollup
+        # plans its aggregate; they persist with the table in budget.duckdb
+        con.execute("ANALYZE operating")
+        con.execute("CHECKPOINT")
+    else:
+        print("  Operating table up to date, reusing")
 
     # ── Load and enrich CIP data ──
-    _build_cip_table(con)
+    if force or not (_has_table(con, "cip") and _is_current(processed_path, cip_sources)):
+        _build_cip_table(con)
+        con.execute("ANALYZE cip")
+        con.execute("CHECKPOINT")
+    else:
+        print("  CIP table up to date, reusing")
 
     # ── Export processed parquet (operating only — CIP is small) ──
-    processed_path = PROCESSED_DIR / "budget.parquet"
-    con.execute(f"""
-        COPY (
-            SELECT * FROM operating
-            UNION ALL
-            SELECT
-                amount, fiscal_year, budget_cycle, source,
-                NULL AS account_type, NULL AS account_class, NULL AS account_group,
-                'Expense' AS revenue_or_expense,
-                NULL AS account, NULL AS account_number,
-                NULL AS dept_group, asset_owning_dept AS dept_name, NULL AS dept_division,
-                NULL AS fund_type, NULL AS fund_name, NULL AS fund_number
-            FROM cip
-        ) TO '{processed_path}' (FORMAT PARQUET, COMPRESSION ZSTD)
-    """)
-    size_mb = processed_path.stat().st_size / (1024 * 1024)
-    print(f"  Exported processed data -> {processed_path} ({size_mb:.1f} MB)")
+    if force or not _is_current(processed_path, op_sources + cip_sources):
+        con.execute("""
+            COPY (
+                SELECT * FROM operating
+                UNION ALL
+                SELECT
+                    amount, fiscal_year, budget_cycle, source,
+                    NULL AS account_type, NULL AS account_class, NULL AS account_group,
+                    'Expense' AS revenue_or_expense,
+                    NULL AS account, NULL AS account_number,
+                    NULL AS dept_group, asset_owning_dept AS dept_name, NULL AS dept_division,
+                    NULL AS fund_type, NULL AS fund_name, NULL AS fund_number
+                FROM cip
+                ORDER BY fiscal_year
+            ) TO ? (FORMAT PARQUET, COMPRESSION ZSTD)
+        """, [str(processed_path)])
+        size_mb = processed_path.stat().st_size / (1024 * 1024)
+        print(f"  Exported processed data -> {processed_path} ({size_mb:.1f} MB)")
 
     # ── Build aggregations ──
-    _build_aggregations(con)
+    _build_aggregations(con, force=force)
 
-    con.close()
     print("Transform complete.")
+    return con
+
+
+def _raw_paths(names: tuple[str, ...]) -> list[Path]:
+    return [RAW_DIR / name for name in names]
+
+
+def _is_current(target: Path, sources: list[Path]) -> bool:
+    """True if target exists and is newer than every source that exists."""
+    if not target.exists():
+        return False
+    mtime = target.stat().st_mtime
+    return all(mtime > src.stat().st_mtime for src in sources if src.exists())
+
+
+def _has_table(con: duckdb.DuckDBPyConnection, name: str) -> bool:
+    return con.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name = ?", [name]
+    ).fetchone()[0] > 0
 
 
 def _load_reference_tables(con: duckdb.DuckDBPyConnection) -> None:
-    """Load the 3 reference CSVs into DuckDB tables."""
+    """Load the 3 reference CSVs into DuckDB tables: BIGINT join key + looked-up columns."""
     ref_files = {
-        "ref_accounts": RAW_DIR / "ref_accounts.csv",
-        "ref_departments": RAW_DIR / "ref_departments.csv",
-        "ref_funds": RAW_DIR / "ref_funds.csv",
+        "ref_accounts": ("account_number", "account_type, account_class, account_group"),
+        "ref_departments": ("funds_center_number", "dept_group, dept_division"),
+        "ref_funds": ("fund_number", "fund_name"),
     }
-    for name, path in ref_files.items():
+    for name, (key, columns) in ref_files.items():
+        path = RAW_DIR / f"{name}.csv"
         if not path.exists():
             print(f"  [warn] Reference file not found: {path}")
             continue
         con.execute(f"DROP TABLE IF EXISTS {name}")
         con.execute(f"""
             CREATE TABLE {name} AS
-            SELECT * FROM read_csv('{path}', header=true, ignore_errors=true)
-        """)
+            SELECT {_join_key(key)}, {columns}
+            FROM read_csv(?, header=true, ignore_errors=true, store_rejects=true, types=?)
+        """, [str(path), {key: "VARCHAR"}])
+        # Key stats for the join planner, so each small ref table is
+        # reliably the hash-build side of its LEFT JOIN
+        con.execute(f"ANALYZE {name}")
         count = con.execute(f"SELECT count(*) FROM {name}").fetchone()[0]
         print(f"  Loaded {name}: {count:,} rows")
+        _report_rejects(con, name, path)
+
+
+# Fiscal year in the raw files is sometimes 2-digit (e.g. "23"), sometimes
+# 4-digit. Both map to 20xx by the last two digits — no branch per row; the
+# data (and validate.py's 2010-2030 check) stays within 2000-2099.
+_FISCAL_YEAR_SQL = "2000 + report_fy % 100 AS fiscal_year"
+
+
+def _join_key(column: str) -> str:
+    """SQL for a code column's integer join key, e.g. fund_number -> fund_key."""
+    return f"TRY_CAST({column} AS BIGINT) AS {column.removesuffix('_number')}_key"
+
+
+# Column types for the raw CSVs, passed to read_csv so the sniffer only has
+# to detect the dialect. A value that doesn't parse as its type rejects the
+# row (ignore_errors) rather than being TRY_CAST in every query downstream;
+# store_rejects logs each one to the reject_errors temp table, which
+# _report_rejects prints and validate.py checks.
+_CIP_TYPES = {"amount": "DOUBLE", "report_fy": "INTEGER"}
+_OPERATING_TYPES = {
+    **_CIP_TYPES,
+    "account_number": "VARCHAR",
+    "funds_center_number": "VARCHAR",
+    "fund_number": "VARCHAR",
+}
+
+
+def _report_rejects(con: duckdb.DuckDBPyConnection, name: str, path: Path) -> None:
+    """Warn about rows read_csv rejected from ``path`` in its latest scan."""
+    rejected, unparsed = con.execute("""
+        SELECT
+            count(DISTINCT line),
+            count(DISTINCT line) FILTER (WHERE error_type = 'CAST')
+        FROM reject_errors
+        WHERE scan_id = (SELECT max(scan_id) FROM reject_scans WHERE file_path = ?)
+    """, [str(path)]).fetchone()
+    if rejected:
+        print(f"  [warn] {name}: {rejected:,} rows rejected ({unparsed:,} with unparseable values)")
 
 
 def _build_operating_table(con: duckdb.DuckDBPyConnection) -> None:
@@ -81,32 +192,41 @@ def _build_operating_table(con: duckdb.DuckDBPyConnection) -> None:
     budget_path = RAW_DIR / "operating_budget.csv"
     actuals_path = RAW_DIR / "operating_actuals.csv"
 
-    # Load raw CSVs
-    for name, path in [("raw_op_budget", budget_path), ("raw_op_actuals", actuals_path)]:
+    # Stage the raw CSVs with amount and fiscal year typed, plus BIGINT
+    # copies of the three codes so the joins below hash and compare fixed-
+    # width integers; the VARCHAR codes are kept for output. Only the
+    # columns used below are projected, so the reader skips the rest.
+    columns = "amount, account, account_number, dept_name, funds_center_number, fund_type, fund_number"
+    for name, path, cols in [
+        ("stg_op_budget", budget_path, f"{columns}, budget_cycle"),
+        ("stg_op_actuals", actuals_path, columns),
+    ]:
         if not path.exists():
             raise FileNotFoundError(f"Required file not found: {path}")
         con.execute(f"DROP TABLE IF EXISTS {name}")
         con.execute(f"""
             CREATE TABLE {name} AS
-            SELECT * FROM read_csv('{path}', header=true, ignore_errors=true)
-        """)
+            SELECT
+                {cols},
+                {_FISCAL_YEAR_SQL},
+                {_join_key("account_number")},
+                {_join_key("funds_center_number")},
+                {_join_key("fund_number")}
+            FROM read_csv(?, header=true, ignore_errors=true, store_rejects=true, types=?)
+        """, [str(path), _OPERATING_TYPES])
         count = con.execute(f"SELECT count(*) FROM {name}").fetchone()[0]
         print(f"  Loaded {name}: {count:,} rows")
+        _report_rejects(con, name, path)
 
     # Build the enriched operating table
-    # The fiscal year in these files is 2-digit (e.g. "23") — add 2000
     con.execute("DROP TABLE IF EXISTS operating")
     con.execute("""
         CREATE TABLE operating AS
 
         -- Budget records
         SELECT
-            TRY_CAST(b.amount AS DOUBLE) AS amount,
-            CASE
-                WHEN TRY_CAST(b.report_fy AS INTEGER) < 100
-                THEN TRY_CAST(b.report_fy AS INTEGER) + 2000
-                ELSE TRY_CAST(b.report_fy AS INTEGER)
-            END AS fiscal_year,
+            b.amount,
+            b.fiscal_year,
             COALESCE(b.budget_cycle, 'adopted') AS budget_cycle,
             'budget' AS source,
             a.account_type,
@@ -118,28 +238,24 @@ def _build_operating_table(con: duckdb.DuckDBPyConnection) -> None:
                 ELSE NULL
             END AS revenue_or_expense,
             b.account,
-            TRY_CAST(b.account_number AS VARCHAR) AS account_number,
+            b.account_number,
             d.dept_group,
             b.dept_name,
             d.dept_division,
             b.fund_type,
             f.fund_name,
-            TRY_CAST(b.fund_number AS VARCHAR) AS fund_number
-        FROM raw_op_budget b
-        LEFT JOIN ref_accounts a ON TRY_CAST(b.account_number AS VARCHAR) = TRY_CAST(a.account_number AS VARCHAR)
-        LEFT JOIN ref_departments d ON TRY_CAST(b.funds_center_number AS VARCHAR) = TRY_CAST(d.funds_center_number AS VARCHAR)
-        LEFT JOIN ref_funds f ON TRY_CAST(b.fund_number AS VARCHAR) = TRY_CAST(f.fund_number AS VARCHAR)
+            b.fund_number
+        FROM stg_op_budget b
+        LEFT JOIN ref_accounts a ON b.account_key = a.account_key
+        LEFT JOIN ref_departments d ON b.funds_center_key = d.funds_center_key
+        LEFT JOIN ref_funds f ON b.fund_key = f.fund_key
 
         UNION ALL
 
         -- Actuals records
         SELECT
-            TRY_CAST(ac.amount AS DOUBLE) AS amount,
-            CASE
-                WHEN TRY_CAST(ac.report_fy AS INTEGER) < 100
-                THEN TRY_CAST(ac.report_fy AS INTEGER) + 2000
-                ELSE TRY_CAST(ac.report_fy AS INTEGER)
-            END AS fiscal_year,
+            ac.amount,
+            ac.fiscal_year,
             'actual' AS budget_cycle,
             'actual' AS source,
             a.account_type,
@@ -151,17 +267,17 @@ def _build_operating_table(con: duckdb.DuckDBPyConnection) -> None:
                 ELSE NULL
             END AS revenue_or_expense,
             ac.account,
-            TRY_CAST(ac.account_number AS VARCHAR) AS account_number,
+            ac.account_number,
             d.dept_group,
             ac.dept_name,
             d.dept_division,
             ac.fund_type,
             f.fund_name,
-            TRY_CAST(ac.fund_number AS VARCHAR) AS fund_number
-        FROM raw_op_actuals ac
-        LEFT JOIN ref_accounts a ON TRY_CAST(ac.account_number AS VARCHAR) = TRY_CAST(a.account_number AS VARCHAR)
-        LEFT JOIN ref_departments d ON TRY_CAST(ac.funds_center_number AS VARCHAR) = TRY_CAST(d.funds_center_number AS VARCHAR)
-        LEFT JOIN ref_funds f ON TRY_CAST(ac.fund_number AS VARCHAR) = TRY_CAST(f.fund_number AS VARCHAR)
+            ac.fund_number
+        FROM stg_op_actuals ac
+        LEFT JOIN ref_accounts a ON ac.account_key = a.account_key
+        LEFT JOIN ref_departments d ON ac.funds_center_key = d.funds_center_key
+        LEFT JOIN ref_funds f ON ac.fund_key = f.fund_key
     """)
 
     count = con.execute("SELECT count(*) FROM operating").fetchone()[0]
@@ -173,7 +289,11 @@ def _build_cip_table(con: duckdb.DuckDBPyConnection) -> None:
     cip_budget_path = RAW_DIR / "cip_budget_fy.csv"
     cip_actuals_path = RAW_DIR / "cip_actuals_fy.csv"
 
-    for name, path in [("raw_cip_budget", cip_budget_path), ("raw_cip_actuals", cip_actuals_path)]:
+    columns = "amount, asset_owning_dept, project_name"
+    for name, path, cols in [
+        ("stg_cip_budget", cip_budget_path, f"{columns}, budget_cycle, project_number"),
+        ("stg_cip_actuals", cip_actuals_path, f"{columns}, project_number_parent"),
+    ]:
         if not path.exists():
             print(f"  [warn] CIP file not found: {path}, skipping")
             con.execute(f"DROP TABLE IF EXISTS {name}")
@@ -182,252 +302,313 @@ def _build_cip_table(con: duckdb.DuckDBPyConnection) -> None:
         con.execute(f"DROP TABLE IF EXISTS {name}")
         con.execute(f"""
             CREATE TABLE {name} AS
-            SELECT * FROM read_csv('{path}', header=true, ignore_errors=true)
-        """)
+            SELECT {cols}, {_FISCAL_YEAR_SQL}
+            FROM read_csv(?, header=true, ignore_errors=true, store_rejects=true, types=?)
+        """, [str(path), _CIP_TYPES])
         count = con.execute(f"SELECT count(*) FROM {name}").fetchone()[0]
         print(f"  Loaded {name}: {count:,} rows")
+        _report_rejects(con, name, path)
 
     con.execute("DROP TABLE IF EXISTS cip")
     con.execute("""
         CREATE TABLE cip AS
 
         SELECT
-            TRY_CAST(b.amount AS DOUBLE) AS amount,
-            CASE
-                WHEN TRY_CAST(b.report_fy AS INTEGER) < 100
-                THEN TRY_CAST(b.report_fy AS INTEGER) + 2000
-                ELSE TRY_CAST(b.report_fy AS INTEGER)
-            END AS fiscal_year,
+            b.amount,
+            b.fiscal_year,
             COALESCE(b.budget_cycle, 'adopted') AS budget_cycle,
             'budget' AS source,
             b.asset_owning_dept,
             b.project_name,
             b.project_number
-        FROM raw_cip_budget b
-        WHERE TRY_CAST(b.amount AS DOUBLE) IS NOT NULL
+        FROM stg_cip_budget b
+        WHERE b.amount IS NOT NULL
 
         UNION ALL
 
         SELECT
-            TRY_CAST(ac.amount AS DOUBLE) AS amount,
-            CASE
-                WHEN TRY_CAST(ac.report_fy AS INTEGER) < 100
-                THEN TRY_CAST(ac.report_fy AS INTEGER) + 2000
-                ELSE TRY_CAST(ac.report_fy AS INTEGER)
-            END AS fiscal_year,
+            ac.amount,
+            ac.fiscal_year,
             'actual' AS budget_cycle,
             'actual' AS source,
             ac.asset_owning_dept,
             ac.project_name,
             ac.project_number_parent AS project_number
-        FROM raw_cip_actuals ac
-        WHERE TRY_CAST(ac.amount AS DOUBLE) IS NOT NULL
+        FROM stg_cip_actuals ac
+        WHERE ac.amount IS NOT NULL
     """)
 
     count = con.execute("SELECT count(*) FROM cip").fetchone()[0]
     print(f"  CIP table: {count:,} rows")
 
 
-def _build_aggregations(con: duckdb.DuckDBPyConnection) -> None:
-    """Build pre-computed aggregation Parquet files for the dashboard."""
-
-    # 1a) Sankey: revenue source → fund type (left → middle)
+# Grouping sets for the operating aggregates, keyed by output file. Every
+# set also groups by fiscal_year, budget_cycle and source; revenue_or_expense
+# rides along where a file filters on it (account_type implies it anyway).
+_OPERATING_ROLLUPS: dict[str, tuple[str, ...]] = {
+    "sankey_revenue": ("account_type", "fund_type", "revenue_or_expense"),
+    "sankey_expense": ("fund_type", "dept_group", "revenue_or_expense"),
+    "dept_budget_trends": ("dept_group", "dept_name", "revenue_or_expense"),
+    "fund_allocation": ("fund_type", "revenue_or_expense"),
+    "budget_vs_actuals": ("dept_name", "dept_group", "account_type"),
+    "revenue_breakdown": ("account_type", "revenue_or_expense"),
+    "dept_detail": ("dept_group", "dept_name", "dept_division", "account_class", "revenue_or_expense"),
+    "council_offices": ("dept_name",),
+    "general_fund_summary": ("dept_name", "dept_group", "revenue_or_expense", "fund_type"),
+}
+_ROLLUP_DIMS = (
+    "account_type", "account_class", "fund_type",
+    "dept_group", "dept_name", "dept_division", "revenue_or_expense",
+)
+
+
+def _grouping_id(name: str) -> int:
+    """GROUPING(*_ROLLUP_DIMS) of the op_rollup rows belonging to one aggregate."""
+    cols = _OPERATING_ROLLUPS[name]
+    return sum(1 << (len(_ROLLUP_DIMS) - 1 - i) for i, dim in enumerate(_ROLLUP_DIMS) if dim not in cols)
+
+
+def _build_rollup(con: duckdb.DuckDBPyConnection) -> None:
+    """Aggregate operating once into op_rollup, one grouping set per aggregate file."""
+    dims = ", ".join(_ROLLUP_DIMS)
+    sets = ",\n".join(
+        f"({', '.join(cols)}, fiscal_year, budget_cycle, source)" for cols in _OPERATING_ROLLUPS.values()
+    )
     con.execute(f"""
-        COPY (
-            SELECT
-                account_type AS revenue_source,
-                fund_type,
-                fiscal_year,
-                budget_cycle,
-                SUM(amount) AS amount
-            FROM operating
-            WHERE revenue_or_expense = 'Revenue'
-              AND account_type IS NOT NULL
-              AND fund_type IS NOT NULL
-              AND source = 'budget'
-            GROUP BY account_type, fund_type, fiscal_year, budget_cycle
-            ORDER BY amount DESC
-        ) TO '{AGGREGATED_DIR}/sankey_revenue.parquet' (FORMAT PARQUET)
+        CREATE OR REPLACE TEMP TABLE op_rollup AS
+        SELECT
+            {dims},
+            fiscal_year,
+            budget_cycle,
+            source,
+            GROUPING({dims}) AS grouping_id,
+            SUM(amount) AS amount
+        FROM operating
+        GROUP BY GROUPING SETS (
+            {sets}
+        )
     """)
-    print("  [agg] sankey_revenue")
+    count = con.execute("SELECT count(*) FROM op_rollup").fetchone()[0]
+    print(f"  Operating rollup: {count:,} rows")
+
+
+def _build_aggregations(con: duckdb.DuckDBPyConnection, *, force: bool = False) -> None:
+    """Build pre-computed aggregation Parquet files for the dashboard.
+
+    The operating files are cut from op_rollup, so operating is scanned and
+    hashed once rather than once per file. Every file is written sorted by
+    fiscal_year (see AGG_PARQUET_OPTIONS). A file already newer than the
+    raw CSVs it derives from is left as-is unless force=True.
+    """
+    op_sources = _raw_paths(OPERATING_CSVS)
+    cip_sources = _raw_paths(CIP_CSVS)
+    if force or not all(
+        _is_current(AGGREGATED_DIR / f"{name}.parquet", op_sources) for name in _OPERATING_ROLLUPS
+    ):
+        _build_rollup(con)
+
+    # 1a) Sankey: revenue source → fund type (left → middle)
+    # Both Sankey files hold one row per link per (fiscal_year, budget_cycle),
+    # clustered by that pair — the dashboard reads one year/cycle slice
+    # as-is, with no GROUP BY, and orders the links itself.
+    _copy_agg(con, "sankey_revenue", f"""
+        SELECT
+            account_type AS revenue_source,
+            fund_type,
+            fiscal_year,
+            budget_cycle,
+            amount
+        FROM op_rollup
+        WHERE grouping_id = {_grouping_id("sankey_revenue")}
+          AND revenue_or_expense = 'Revenue'
+          AND account_type IS NOT NULL
+          AND fund_type IS NOT NULL
+          AND source = 'budget'
+        ORDER BY fiscal_year, budget_cycle
+    """, op_sources, force=force)
 
     # 1b) Sankey: fund type → dept group (middle → right, expense side)
-    con.execute(f"""
-        COPY (
-            SELECT
-                fund_type,
-                dept_group,
-                fiscal_year,
-                budget_cycle,
-                SUM(amount) AS amount
-            FROM operating
-            WHERE revenue_or_expense = 'Expense'
-              AND fund_type IS NOT NULL
-              AND dept_group IS NOT NULL
-              AND source = 'budget'
-            GROUP BY fund_type, dept_group, fiscal_year, budget_cycle
-            ORDER BY amount DESC
-        ) TO '{AGGREGATED_DIR}/sankey_expense.parquet' (FORMAT PARQUET)
-    """)
-    print("  [agg] sankey_expense")
+    _copy_agg(con, "sankey_expense", f"""
+        SELECT
+            fund_type,
+            dept_group,
+            fiscal_year,
+            budget_cycle,
+            amount
+        FROM op_rollup
+        WHERE grouping_id = {_grouping_id("sankey_expense")}
+          AND revenue_or_expense = 'Expense'
+          AND fund_type IS NOT NULL
+          AND dept_group IS NOT NULL
+          AND source = 'budget'
+        ORDER BY fiscal_year, budget_cycle
+    """, op_sources, force=force)
 
     # 2) Department budget trends
-    con.execute(f"""
-        COPY (
-            SELECT
-                dept_group,
-                dept_name,
-                revenue_or_expense,
-                fiscal_year,
-                source,
-                budget_cycle,
-                SUM(amount) AS amount
-            FROM operating
-            WHERE dept_name IS NOT NULL
-            GROUP BY dept_group, dept_name, revenue_or_expense, fiscal_year, source, budget_cycle
-            ORDER BY dept_group, dept_name, fiscal_year
-        ) TO '{AGGREGATED_DIR}/dept_budget_trends.parquet' (FORMAT PARQUET)
-    """)
-    print("  [agg] dept_budget_trends")
+    _copy_agg(con, "dept_budget_trends", f"""
+        SELECT
+            dept_group,
+            dept_name,
+            revenue_or_expense,
+            fiscal_year,
+            source,
+            budget_cycle,
+            amount
+        FROM op_rollup
+        WHERE grouping_id = {_grouping_id("dept_budget_trends")}
+          AND dept_name IS NOT NULL
+        ORDER BY fiscal_year, budget_cycle, source, dept_group, dept_name
+    """, op_sources, force=force)
 
     # 3) Fund allocation
-    con.execute(f"""
-        COPY (
-            SELECT
-                fund_type,
-                revenue_or_expense,
-                fiscal_year,
-                account_type,
-                budget_cycle,
-                source,
-                SUM(amount) AS amount
-            FROM operating
-            WHERE fund_type IS NOT NULL
-            GROUP BY fund_type, revenue_or_expense, fiscal_year, account_type, budget_cycle, source
-            ORDER BY fund_type, fiscal_year
-        ) TO '{AGGREGATED_DIR}/fund_allocation.parquet' (FORMAT PARQUET)
-    """)
-    print("  [agg] fund_allocation")
-
-    # 4) Budget vs actuals
-    con.execute(f"""
-        COPY (
-            SELECT
-                dept_name,
-                dept_group,
-                fiscal_year,
-                account_type,
-                SUM(CASE WHEN source = 'budget' AND budget_cycle = 'adopted' THEN amount ELSE 0 END) AS budget_amount,
-                SUM(CASE WHEN source = 'actual' THEN amount ELSE 0 END) AS actual_amount
-            FROM operating
-            WHERE dept_name IS NOT NULL
-            GROUP BY dept_name, dept_group, fiscal_year, account_type
-            HAVING (budget_amount != 0 OR actual_amount != 0)
-            ORDER BY dept_name, fiscal_year
-        ) TO '{AGGREGATED_DIR}/budget_vs_actuals.parquet' (FORMAT PARQUET)
-    """)
-    print("  [agg] budget_vs_actuals")
+    _copy_agg(con, "fund_allocation", f"""
+        SELECT
+            fund_type,
+            revenue_or_expense,
+            fiscal_year,
+            budget_cycle,
+            source,
+            amount
+        FROM op_rollup
+        WHERE grouping_id = {_grouping_id("fund_allocation")}
+          AND fund_type IS NOT NULL
+        ORDER BY fiscal_year, budget_cycle, source, fund_type
+    """, op_sources, force=force)
+
+    # 4) Budget vs actuals — the rollup rows are split by source and cycle,
+    #    so fold them into the two amount columns here
+    _copy_agg(con, "budget_vs_actuals", f"""
+        SELECT
+            dept_name,
+            dept_group,
+            fiscal_year,
+            account_type,
+            SUM(CASE WHEN source = 'budget' AND budget_cycle = 'adopted' THEN amount ELSE 0 END) AS budget_amount,
+            SUM(CASE WHEN source = 'actual' THEN amount ELSE 0 END) AS actual_amount
+        FROM op_rollup
+        WHERE grouping_id = {_grouping_id("budget_vs_actuals")}
+          AND dept_name IS NOT NULL
+        GROUP BY dept_name, dept_group, fiscal_year, account_type
+        HAVING (budget_amount != 0 OR actual_amount != 0)
+        ORDER BY fiscal_year, dept_name
+    """, op_sources, force=force)
 
     # 5) Revenue breakdown
-    con.execute(f"""
-        COPY (
-            SELECT
-                account_type,
-                account_class,
-                fiscal_year,
-                budget_cycle,
-                source,
-                SUM(amount) AS amount
-            FROM operating
-            WHERE revenue_or_expense = 'Revenue'
-              AND account_type IS NOT NULL
-            GROUP BY account_type, account_class, fiscal_year, budget_cycle, source
-            ORDER BY account_type, fiscal_year
-        ) TO '{AGGREGATED_DIR}/revenue_breakdown.parquet' (FORMAT PARQUET)
-    """)
-    print("  [agg] revenue_breakdown")
-
-    # 6) Department detail (drill-down)
-    con.execute(f"""
-        COPY (
-            SELECT
-                dept_group,
-                dept_name,
-                dept_division,
-                account_class,
-                account_type,
-                revenue_or_expense,
-                fiscal_year,
-                budget_cycle,
-                source,
-                SUM(amount) AS amount
-            FROM operating
-            WHERE dept_name IS NOT NULL
-            GROUP BY dept_group, dept_name, dept_division, account_class, account_type,
-                     revenue_or_expense, fiscal_year, budget_cycle, source
-            ORDER BY dept_group, dept_name, fiscal_year
-        ) TO '{AGGREGATED_DIR}/dept_detail.parquet' (FORMAT PARQUET)
-    """)
-    print("  [agg] dept_detail")
+    _copy_agg(con, "revenue_breakdown", f"""
+        SELECT
+            account_type,
+            fiscal_year,
+            budget_cycle,
+            source,
+            amount
+        FROM op_rollup
+        WHERE grouping_id = {_grouping_id("revenue_breakdown")}
+          AND revenue_or_expense = 'Revenue'
+          AND account_type IS NOT NULL
+        ORDER BY fiscal_year, budget_cycle, source, account_type
+    """, op_sources, force=force)
+
+    # 6) Department detail (drill-down) — every reader asks for expenses
+    #    by division and account class, so revenue rows aren't written
+    _copy_agg(con, "dept_detail", f"""
+        SELECT
+            dept_group,
+            dept_name,
+            dept_division,
+            account_class,
+            revenue_or_expense,
+            fiscal_year,
+            budget_cycle,
+            source,
+            amount
+        FROM op_rollup
+        WHERE grouping_id = {_grouping_id("dept_detail")}
+          AND dept_name IS NOT NULL
+          AND revenue_or_expense = 'Expense'
+        ORDER BY fiscal_year, budget_cycle, source, dept_group, dept_name
+    """, op_sources, force=force)
 
     # 7) Council offices
-    con.execute(f"""
-        COPY (
-            SELECT
-                dept_name,
-                account_class,
-                account_type,
-                fiscal_year,
-                budget_cycle,
-                source,
-                SUM(amount) AS amount
-            FROM operating
-            WHERE dept_name LIKE 'Council District%'
-               OR dept_name LIKE 'City Council%'
-            GROUP BY dept_name, account_class, account_type, fiscal_year, budget_cycle, source
-            ORDER BY dept_name, fiscal_year
-        ) TO '{AGGREGATED_DIR}/council_offices.parquet' (FORMAT PARQUET)
-    """)
-    print("  [agg] council_offices")
+    _copy_agg(con, "council_offices", f"""
+        SELECT
+            dept_name,
+            fiscal_year,
+            budget_cycle,
+            source,
+            amount
+        FROM op_rollup
+        WHERE grouping_id = {_grouping_id("council_offices")}
+          AND (dept_name LIKE 'Council District%' OR dept_name LIKE 'City Council%')
+        ORDER BY fiscal_year, budget_cycle, source, dept_name
+    """, op_sources, force=force)
 
     # 8) General Fund summary
-    con.execute(f"""
-        COPY (
-            SELECT
-                dept_name,
-                dept_group,
-                account_class,
-                account_type,
-                revenue_or_expense,
-                fiscal_year,
-                budget_cycle,
-                source,
-                SUM(amount) AS amount
-            FROM operating
-            WHERE fund_type = 'General Fund'
-            GROUP BY dept_name, dept_group, account_class, account_type,
-                     revenue_or_expense, fiscal_year, budget_cycle, source
-            ORDER BY dept_name, fiscal_year
-        ) TO '{AGGREGATED_DIR}/general_fund_summary.parquet' (FORMAT PARQUET)
-    """)
-    print("  [agg] general_fund_summary")
+    _copy_agg(con, "general_fund_summary", f"""
+        SELECT
+            dept_name,
+            dept_group,
+            revenue_or_expense,
+            fiscal_year,
+            budget_cycle,
+            source,
+            amount
+        FROM op_rollup
+        WHERE grouping_id = {_grouping_id("general_fund_summary")}
+          AND fund_type = 'General Fund'
+        ORDER BY fiscal_year, budget_cycle, source, dept_name
+    """, op_sources, force=force)
 
     # 9) CIP by department
-    con.execute(f"""
-        COPY (
-            SELECT
-                asset_owning_dept,
-                project_name,
-                fiscal_year,
-                source,
-                SUM(amount) AS amount
-            FROM cip
-            GROUP BY asset_owning_dept, project_name, fiscal_year, source
-            ORDER BY asset_owning_dept, fiscal_year
-        ) TO '{AGGREGATED_DIR}/cip_by_dept.parquet' (FORMAT PARQUET)
-    """)
-    print("  [agg] cip_by_dept")
+    _copy_agg(con, "cip_by_dept", """
+        SELECT
+            asset_owning_dept,
+            project_name,
+            fiscal_year,
+            source,
+            SUM(amount) AS amount
+        FROM cip
+        GROUP BY asset_owning_dept, project_name, fiscal_year, source
+        ORDER BY fiscal_year, source, asset_owning_dept
+    """, cip_sources, force=force)
+
+    # 10) Selectbox name lists — the dashboard loads these once instead of
+    #     running a DISTINCT scan on every rerun
+    _write_name_list(con, "cip_depts", "cip_by_dept", "asset_owning_dept", force=force)
+    _write_name_list(con, "dept_names", "dept_detail", "dept_name", force=force)
+
+
+def _copy_agg(
+    con: duckdb.DuckDBPyConnection, name: str, select_sql: str, sources: list[Path], *, force: bool
+) -> None:
+    """COPY a query to ``{name}.parquet`` unless that file is already newer than its sources."""
+    path = AGGREGATED_DIR / f"{name}.parquet"
+    if not force and _is_current(path, sources):
+        print(f"  [agg] {name} (up to date)")
+        return
+    con.execute(f"COPY ({select_sql}) TO ? ({AGG_PARQUET_OPTIONS})", [str(path)])
+    print(f"  [agg] {name}")
+
+
+def _write_name_list(
+    con: duckdb.DuckDBPyConnection, name: str, agg: str, column: str, *, force: bool
+) -> None:
+    """Write the sorted distinct non-null values of an aggregate column as JSON."""
+    path = AGGREGATED_DIR / f"{name}.json"
+    agg_path = AGGREGATED_DIR / f"{agg}.parquet"
+    if not force and _is_current(path, [agg_path]):
+        print(f"  [agg] {name} (up to date)")
+        return
+    # Column and path are both bound; COLUMNS picks the column by exact name
+    rows = con.execute("""
+        SELECT DISTINCT value FROM (
+            SELECT COLUMNS(c -> c = ?) AS value FROM read_parquet(?)
+        )
+        WHERE value IS NOT NULL
+        ORDER BY value
+    """, [column, str(agg_path)]).fetchall()
+    path.write_text(json.dumps([r[0] for r in rows], indent=2) + "\n")
+    print(f"  [agg] {name}")
 
 
 if __name__ == "__main__":
-    transform()
+    transform().close()
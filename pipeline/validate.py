@@ -40,9 +40,16 @@ def _warn(name: str, detail: str) -> None:
     print(f"  WARN  {name} — {detail}")
 
 
-def validate() -> int:
-    """Run all validation checks. Returns number of failures."""
-    con = duckdb.connect()
+def validate(con: duckdb.DuckDBPyConnection | None = None) -> int:
+    """Run all validation checks. Returns number of failures.
+
+    Pass the transform's open connection (as pipeline.build does) to take
+    the budget.parquet stats from its operating/cip tables instead of
+    decoding the file again, and to check the CSV rows it rejected.
+    """
+    owns_con = con is None
+    if owns_con:
+        con = duckdb.connect()
 
     print("=" * 60)
     print("Data Validation")
@@ -61,6 +68,8 @@ def validate() -> int:
     for name in expected_aggs:
         path = AGG / f"{name}.parquet"
         _check(f"{name}.parquet exists", path.exists())
+    for name in ["cip_depts", "dept_names"]:
+        _check(f"{name}.json exists", (AGG / f"{name}.json").exists())
 
     # ── 2. Row counts (non-empty) ──
     print("\n-- Row counts --")
@@ -73,13 +82,15 @@ def validate() -> int:
 
     # ── 3. No double-counting: expense totals should be ~$4-6B for recent FY, not ~$10B ──
     print("\n-- Double-counting guards --")
-    expense_total = con.execute(f"""
-        SELECT SUM(amount) FROM '{AGG}/dept_budget_trends.parquet'
-        WHERE revenue_or_expense = 'Expense'
-          AND source = 'budget'
+    expense_total, unfiltered_total = con.execute(f"""
+        SELECT
+            COALESCE(SUM(amount) FILTER (WHERE revenue_or_expense = 'Expense'), 0),
+            COALESCE(SUM(amount), 0)
+        FROM '{AGG}/dept_budget_trends.parquet'
+        WHERE source = 'budget'
           AND budget_cycle = 'adopted'
           AND fiscal_year = 2025
-    """).fetchone()[0] or 0
+    """).fetchone()
 
     _check(
         "FY2025 adopted expense total in reasonable range ($1B-$8B)",
@@ -88,13 +99,6 @@ def validate() -> int:
     )
 
     # Check that unfiltered total is roughly double (revenue + expense)
-    unfiltered_total = con.execute(f"""
-        SELECT SUM(amount) FROM '{AGG}/dept_budget_trends.parquet'
-        WHERE source = 'budget'
-          AND budget_cycle = 'adopted'
-          AND fiscal_year = 2025
-    """).fetchone()[0] or 0
-
     _check(
         "Unfiltered total > expense total (confirms rev+exp split exists)",
         unfiltered_total > expense_total * 1.3,
@@ -103,21 +107,28 @@ def validate() -> int:
 
     # ── 4. revenue_or_expense column present where needed ──
     print("\n-- Required columns --")
-    for name in ["dept_budget_trends", "fund_allocation", "dept_detail", "general_fund_summary"]:
+    # Column names straight from each file's footer (no query to bind)
+    schemas: dict[str, set[str]] = {}
+    for name in expected_aggs:
         path = AGG / f"{name}.parquet"
-        if not path.exists():
+        if path.exists():
+            rows = con.execute(f"SELECT name FROM parquet_schema('{path}')").fetchall()
+            schemas[name] = {r[0] for r in rows}
+    for name in ["dept_budget_trends", "fund_allocation", "dept_detail", "general_fund_summary"]:
+        if name not in schemas:
             continue
-        cols = [r[0] for r in con.execute(f"DESCRIBE SELECT * FROM '{path}'").fetchall()]
-        _check(f"{name} has revenue_or_expense column", "revenue_or_expense" in cols)
+        _check(f"{name} has revenue_or_expense column", "revenue_or_expense" in schemas[name])
 
     # ── 5. Budget cycle filter: FY2024/2025 should not double from adopted+proposed ──
     print("\n-- Budget cycle duplication --")
+    cycles_by_fy = dict(con.execute(f"""
+        SELECT fiscal_year, list(DISTINCT budget_cycle)
+        FROM '{AGG}/dept_budget_trends.parquet'
+        WHERE fiscal_year IN (2024, 2025) AND source = 'budget'
+        GROUP BY fiscal_year
+    """).fetchall())
     for fy in [2024, 2025]:
-        cycles = con.execute(f"""
-            SELECT DISTINCT budget_cycle FROM '{AGG}/dept_budget_trends.parquet'
-            WHERE fiscal_year = {fy} AND source = 'budget'
-        """).fetchall()
-        cycle_list = [r[0] for r in cycles]
+        cycle_list = cycles_by_fy.get(fy, [])
         has_both = "adopted" in cycle_list and "proposed" in cycle_list
         if has_both:
             _warn(
@@ -133,46 +144,44 @@ def validate() -> int:
     exp_path = AGG / "sankey_expense.parquet"
 
     if rev_path.exists() and exp_path.exists():
+        # One pass per file: distinct labels, latest year, FY2025 adopted total
+        rev_source_names, rev_max_fy, rev_total = con.execute(f"""
+            SELECT
+                COALESCE(list(DISTINCT revenue_source), []),
+                MAX(fiscal_year),
+                COALESCE(SUM(amount) FILTER (WHERE fiscal_year = 2025 AND budget_cycle = 'adopted'), 0)
+            FROM '{rev_path}'
+        """).fetchone()
+        exp_dept_names, exp_max_fy, exp_total = con.execute(f"""
+            SELECT
+                COALESCE(list(DISTINCT dept_group), []),
+                MAX(fiscal_year),
+                COALESCE(SUM(amount) FILTER (WHERE fiscal_year = 2025 AND budget_cycle = 'adopted'), 0)
+            FROM '{exp_path}'
+        """).fetchone()
+
         # Revenue side should only have revenue records
-        rev_sources = con.execute(f"""
-            SELECT DISTINCT revenue_source FROM '{rev_path}'
-        """).fetchall()
-        rev_source_names = [r[0] for r in rev_sources]
         has_expense_in_rev = any(s in ("Personnel", "Non-Personnel") for s in rev_source_names)
         _check("Sankey revenue has no expense categories", not has_expense_in_rev,
                f"sources: {rev_source_names[:5]}...")
 
         # Expense side should only have expense dept groups
-        exp_depts = con.execute(f"""
-            SELECT DISTINCT dept_group FROM '{exp_path}'
-        """).fetchall()
-        exp_dept_names = [r[0] for r in exp_depts]
         has_major_rev = "Major Revenues" in exp_dept_names
         _check("Sankey expense has no 'Major Revenues' dept", not has_major_rev)
 
         # Both sides should have data for recent years
-        for label, path in [("revenue", rev_path), ("expense", exp_path)]:
-            max_fy = con.execute(f"SELECT MAX(fiscal_year) FROM '{path}'").fetchone()[0]
+        for label, max_fy in [("revenue", rev_max_fy), ("expense", exp_max_fy)]:
             _check(f"Sankey {label} has recent data", max_fy and max_fy >= 2024,
                    f"max FY={max_fy}")
 
         # Revenue and expense totals for same year should be roughly comparable
-        for fy in [2025]:
-            rev_total = con.execute(f"""
-                SELECT SUM(amount) FROM '{rev_path}'
-                WHERE fiscal_year = {fy} AND budget_cycle = 'adopted'
-            """).fetchone()[0] or 0
-            exp_total = con.execute(f"""
-                SELECT SUM(amount) FROM '{exp_path}'
-                WHERE fiscal_year = {fy} AND budget_cycle = 'adopted'
-            """).fetchone()[0] or 0
-            if rev_total > 0 and exp_total > 0:
-                ratio = max(rev_total, exp_total) / min(rev_total, exp_total)
-                _check(
-                    f"Sankey FY{fy} revenue/expense within 2x",
-                    ratio < 2.0,
-                    f"revenue=${rev_total/1e9:.2f}B expense=${exp_total/1e9:.2f}B ratio={ratio:.2f}",
-                )
+        if rev_total > 0 and exp_total > 0:
+            ratio = max(rev_total, exp_total) / min(rev_total, exp_total)
+            _check(
+                "Sankey FY2025 revenue/expense within 2x",
+                ratio < 2.0,
+                f"revenue=${rev_total/1e9:.2f}B expense=${exp_total/1e9:.2f}B ratio={ratio:.2f}",
+            )
 
     # ── 7. Column availability — filters must match parquet schemas ──
     print("\n-- Filter column compatibility --")
@@ -187,10 +196,9 @@ def validate() -> int:
         "cip_by_dept": {"dept_group": False, "fund_type": False},
     }
     for name, expected_cols in col_expectations.items():
-        path = AGG / f"{name}.parquet"
-        if not path.exists():
+        if name not in schemas:
             continue
-        cols = [r[0] for r in con.execute(f"DESCRIBE SELECT * FROM '{path}'").fetchall()]
+        cols = schemas[name]
         for col, should_exist in expected_cols.items():
             has_col = col in cols
             if should_exist:
@@ -202,12 +210,31 @@ def validate() -> int:
                     _check(f"{name} correctly lacks {col} (dashboard uses safe WHERE)", True)
 
     # ── 8. Fiscal year range sanity --
-    print("\n-- Fiscal year range --")
+    # budget.parquet is scanned once for both this and the NULL rates below;
+    # with the transform's tables at hand, read the rows it was written from
+    processed = f"'{processed_path}'"
+    if con.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name IN ('operating', 'cip')"
+    ).fetchone()[0] == 2:
+        processed = """(
+            SELECT fiscal_year, revenue_or_expense, amount FROM operating
+            UNION ALL
+            SELECT fiscal_year, 'Expense', amount FROM cip
+        )"""
     if processed_path.exists():
-        fy_range = con.execute(f"""
-            SELECT MIN(fiscal_year), MAX(fiscal_year) FROM '{processed_path}'
+        total_rows, min_fy, max_fy, *null_counts = con.execute(f"""
+            SELECT
+                count(*),
+                MIN(fiscal_year),
+                MAX(fiscal_year),
+                count(*) FILTER (WHERE revenue_or_expense IS NULL),
+                count(*) FILTER (WHERE fiscal_year IS NULL),
+                count(*) FILTER (WHERE amount IS NULL)
+            FROM {processed}
         """).fetchone()
-        min_fy, max_fy = fy_range
+
+    print("\n-- Fiscal year range --")
+    if processed_path.exists():
         _check("Min fiscal year >= 2010", min_fy is not None and min_fy >= 2010,
                f"min={min_fy}")
         _check("Max fiscal year <= 2030", max_fy is not None and max_fy <= 2030,
@@ -216,17 +243,31 @@ def validate() -> int:
     # ── 9. NULL rate on critical columns ──
     print("\n-- NULL rates --")
     if processed_path.exists():
-        total_rows = con.execute(f"SELECT count(*) FROM '{processed_path}'").fetchone()[0]
-        for col in ["revenue_or_expense", "fiscal_year", "amount"]:
-            null_count = con.execute(f"""
-                SELECT count(*) FROM '{processed_path}' WHERE {col} IS NULL
-            """).fetchone()[0]
+        for col, null_count in zip(["revenue_or_expense", "fiscal_year", "amount"], null_counts):
             pct = (null_count / total_rows * 100) if total_rows > 0 else 0
             if pct > 10:
                 _warn(f"{col} NULL rate", f"{pct:.1f}% ({null_count:,}/{total_rows:,})")
             else:
                 _check(f"{col} NULL rate < 10%", True, f"{pct:.1f}%")
 
+    # The transform rejects rows whose amount or year doesn't parse instead
+    # of keeping them as NULLs, so they never show in the rates above; hold
+    # them to the same 10% bound, but as a failure since the rows are gone.
+    # The reject log is only on the transform's own connection (pipeline.build).
+    if processed_path.exists() and con.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name = 'reject_errors'"
+    ).fetchone()[0]:
+        unparsed = con.execute("""
+            SELECT count(DISTINCT (scan_id, line)) FROM reject_errors
+            WHERE error_type = 'CAST' AND column_name IN ('amount', 'report_fy')
+        """).fetchone()[0]
+        pct = unparsed / (total_rows + unparsed) * 100 if unparsed else 0
+        detail = f"{pct:.1f}% ({unparsed:,} rows dropped)"
+        if 0 < pct <= 10:
+            _warn("Raw rows rejected for unparseable amount/report_fy", detail)
+        else:
+            _check("Unparseable amount/report_fy rejects < 10%", pct <= 10, detail)
+
     # ── 10. Budget vs Actuals: actuals should exist for at least FY11-FY23 ──
     print("\n-- Actuals coverage --")
     bva_path = AGG / "budget_vs_actuals.parquet"
@@ -254,7 +295,8 @@ def validate() -> int:
     _check("Total aggregated < 10MB", total_agg < 10, f"{total_agg:.1f}MB")
 
     # ── Summary ──
-    con.close()
+    if owns_con:
+        con.close()
     print("\n" + "=" * 60)
     print(f"Results: {passed} passed, {failed} failed, {warnings} warnings")
     print("=" * 60)